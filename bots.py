@@ -12,7 +12,6 @@ from __future__ import annotations   # enables PEP 604 | syntax on Python 3.8+
 
 import random
 from typing import Optional, List, Tuple
-from maps import get_sector
 from game_state import (
     ENGINEERING_LAYOUT, CIRCUITS, RADIATION_NODES, SYSTEM_MAX_CHARGE,
     direction_delta, get_available_nodes,
@@ -76,7 +75,7 @@ class CaptainBot:
         Returns (type1, val1, type2, val2).
         """
         er, ec = own_sub["position"]
-        actual_sector = get_sector(er, ec, map_def["sector_size"], map_def["cols"])
+        actual_sector = map_def["sector_table"][er][ec]
 
         type_options = ["row", "col", "sector"]
         random.shuffle(type_options)
@@ -128,7 +127,7 @@ class CaptainBot:
         """Choose a starting position — safe corner for our team."""
         rows = map_def["rows"]
         cols = map_def["cols"]
-        island_set = set(tuple(p) for p in map_def["islands"])
+        island_set = map_def["island_set"]
 
         # Blue → top-left quadrant, Red → bottom-right quadrant
         if self.team == "blue":
@@ -171,12 +170,16 @@ class CaptainBot:
             return None
 
         r, c = pos
-        trail_set = set(tuple(p) for p in sub.get("trail", []))
-        mine_set  = set(tuple(m) for m in sub.get("mines", []))
+        # Live submarines keep tuple-keyed sets already; serialized ones only have lists
+        if "trail_set" in sub:
+            trail_set, mine_set = sub["trail_set"], sub["mines_set"]   # read-only here
+        else:
+            trail_set = set(map(tuple, sub.get("trail", [])))
+            mine_set  = set(map(tuple, sub.get("mines", [])))
         systems = sub.get("systems", {})
         rows = map_def["rows"]
         cols = map_def["cols"]
-        island_set = set(tuple(p) for p in map_def["islands"])
+        island_set = map_def["island_set"]
 
         # Already surfaced — shouldn't happen (server handles dive), but guard
         if sub.get("surfaced"):
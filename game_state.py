@@ -45,8 +45,9 @@ Sonar (interactive): activating FM/captain triggers sonar_query to enemy captain
   The activating team receives the enemy captain's stated info (not server-computed truth).
 """
 
-from maps import get_sector, MAPS
-import copy
+from maps import MAPS
+from collections import deque
+import functools
 
 # ── Engineering board definition ──────────────────────────────────────────────
 # Node color → which systems it affects when marked:
@@ -102,6 +103,30 @@ RADIATION_NODES = [
     ("west", 5), ("north", 5), ("south", 5), ("east", 5),
 ]
 
+# (direction, index) → single bit; used to evaluate the overload rules as masks
+NODE_BIT = {
+    direction: tuple(1 << (d * 6 + i) for i in range(len(nodes)))
+    for d, (direction, nodes) in enumerate(ENGINEERING_LAYOUT.items())
+}
+NODES_PER_DIRECTION = 6
+# Flat node id (= bit position) of a direction's node 0
+DIR_OFFSET = {direction: d * NODES_PER_DIRECTION for d, direction in enumerate(ENGINEERING_LAYOUT)}
+# Node id → (direction, index); inverse of NODE_BIT
+NODE_AT = tuple(
+    (direction, i) for direction, nodes in ENGINEERING_LAYOUT.items() for i in range(len(nodes))
+)
+# Node id → color / circuit id (None for non-circuit nodes)
+NODE_COLOR   = tuple(ENGINEERING_LAYOUT[d][i]["color"] for d, i in NODE_AT)
+NODE_CIRCUIT = tuple(ENGINEERING_LAYOUT[d][i]["circuit"] for d, i in NODE_AT)
+
+CIRCUIT_MASK   = {cid: sum(NODE_BIT[d][i] for d, i in nodes) for cid, nodes in CIRCUITS.items()}
+RADIATION_MASK = sum(NODE_BIT[d][i] for d, i in RADIATION_NODES)
+DIRECTION_MASK = {direction: sum(bits) for direction, bits in NODE_BIT.items()}
+COLOR_MASK = {
+    color: sum(1 << node for node, c in enumerate(NODE_COLOR) if c == color)
+    for color in set(NODE_COLOR)
+}
+
 # Node color → systems it blocks when marked
 SYSTEM_COLORS = {
     "torpedo": "red",
@@ -111,6 +136,24 @@ SYSTEM_COLORS = {
     "stealth": "yellow",
 }
 
+# System → bit in a submarine's "blocked" mask (see _blocked_systems)
+SYSTEM_BIT = {
+    "torpedo": 1,
+    "mine":    2,
+    "sonar":   4,
+    "drone":   8,
+    "stealth": 16,
+}
+ALL_SYSTEMS = sum(SYSTEM_BIT.values())
+
+# Node color → SYSTEM_BIT mask of every system that color blocks
+COLOR_SYSTEMS = {
+    color: sum(SYSTEM_BIT[s] for s, c in SYSTEM_COLORS.items() if c == color)
+    for color in set(SYSTEM_COLORS.values())
+}
+# (node mask of a color, systems it blocks) for every blocking color
+_BLOCKING = tuple((COLOR_MASK[color], systems) for color, systems in COLOR_SYSTEMS.items())
+
 SYSTEM_MAX_CHARGE = {
     "torpedo": 3,
     "mine":    3,
@@ -119,71 +162,148 @@ SYSTEM_MAX_CHARGE = {
     "stealth": 5,
 }
 
+# Parallel (name, max charge) tuples for loops over every system
+SYSTEM_NAMES = tuple(SYSTEM_MAX_CHARGE)
+SYSTEM_MAX   = tuple(SYSTEM_MAX_CHARGE.values())
+
 TEAMS = ["blue", "red"]
+OPPONENT = {"blue": "red", "red": "blue"}
+# Captain direction → (row delta, col delta)
+DIRECTION_DELTA = {"north": (-1, 0), "south": (1, 0), "west": (0, -1), "east": (0, 1)}
 ROLES = ["captain", "first_mate", "engineer", "radio_operator"]
 
+# Most recent game["log"] entries kept; the log is a debugging aid, not game state
+LOG_MAX = 500
+
+# ── Event types ───────────────────────────────────────────────────────────────
+# Values of the "type" key on events returned by the actions below; server.py
+# keys EVENT_HANDLERS on these, so producers and consumers share one spelling.
+
+EV_MOVED              = "moved"
+EV_MOVED_PRIVATE      = "moved_private"
+EV_SURFACED           = "surfaced"
+EV_STEALTH_USED       = "stealth_used"
+EV_TORPEDO_FIRED      = "torpedo_fired"
+EV_MINE_PLACED        = "mine_placed"
+EV_MINE_DETONATED     = "mine_detonated"
+EV_DAMAGE             = "damage"
+EV_ENGINEERING_DAMAGE = "engineering_damage"
+EV_CIRCUIT_CLEARED    = "circuit_cleared"
+EV_RADIATION_DAMAGE   = "radiation_damage"
+EV_DIRECTION_DAMAGE   = "direction_damage"
+EV_SYSTEM_CHARGED     = "system_charged"
+EV_SONAR_ACTIVATED    = "sonar_activated"
+EV_SONAR_ANNOUNCED    = "sonar_announced"
+EV_SONAR_RESULT       = "sonar_result"
+EV_DRONE_USED         = "drone_used"
+EV_DRONE_RESULT       = "drone_result"
+EV_DRONE_ANNOUNCED    = "drone_announced"
+EV_TURN_END           = "turn_end"
+EV_TURN_START         = "turn_start"
+EV_GAME_OVER          = "game_over"
+EV_ERROR              = "error"
+
 
 # ── Engineering Board ──────────────────────────────────────────────────────────
 
-def make_engineering_board():
-    """Return a fresh engineering board state dict."""
-    board = {}
-    for direction, nodes in ENGINEERING_LAYOUT.items():
-        board[direction] = [
-            {"color": n["color"], "circuit": n["circuit"], "marked": False}
-            for n in nodes
+def _board_from_bits(marked):
+    """Build the per-node board dicts for a NODE_BIT mask from the NODE_* tables."""
+    return {
+        direction: [
+            {"color": NODE_COLOR[node], "circuit": NODE_CIRCUIT[node], "marked": bool(marked >> node & 1)}
+            for node in range(offset, offset + NODES_PER_DIRECTION)
         ]
-    return board
+        for direction, offset in DIR_OFFSET.items()
+    }
 
 
-def clear_engineering_board(board):
-    """Clear ALL marked nodes on the entire engineering board."""
-    for dir_nodes in board.values():
-        for node in dir_nodes:
-            node["marked"] = False
+def make_engineering_board():
+    """Return a fresh, standalone engineering board dict (see engineer_mark_node)."""
+    return _board_from_bits(0)
 
 
-def engineer_mark_node(board, direction, index):
-    """
-    Mark node at (direction, index).
-    Returns a list of events: [{"type": ..., ...}]
+def engineering_view(sub):
+    """Return a submarine's engineering board as per-node dicts, for clients and bots.
+    Built fresh from sub["eng_marked"], the board's only state; changing it has no effect."""
+    return _board_from_bits(sub["eng_marked"])
 
-    RULEBOOK:
-    - Circuit completed (C1/C2/C3) → clear those 4 nodes only, no damage.
-    - Direction overload (all 6 nodes in one section) → 1 damage + clear ENTIRE board.
-    - Radiation overload (all 4 radiation nodes) → 1 damage + clear ENTIRE board.
-    """
-    if board[direction][index]["marked"]:
-        return [{"type": "error", "msg": "Node already marked"}]
 
-    board[direction][index]["marked"] = True
+def clear_engineering_board(sub):
+    """Clear ALL marked nodes on a submarine's engineering board."""
+    sub["eng_marked"] = 0
+    sub["blocked"] = 0
+
+
+def board_bits(board):
+    """Return the marked nodes of an engineering board as a NODE_BIT mask."""
+    marked = 0
+    for direction, nodes in board.items():
+        for node, bit in zip(nodes, NODE_BIT[direction]):
+            if node["marked"]:
+                marked |= bit
+    return marked
+
+
+def _sync_board(board, old, new):
+    """Write the nodes that differ between masks `old` and `new` back to the board dicts."""
+    changed = old ^ new
+    while changed:
+        bit = changed & -changed
+        d, i = NODE_AT[bit.bit_length() - 1]
+        board[d][i]["marked"] = bool(new & bit)
+        changed ^= bit
+
+
+def _mark_bits(marked, direction, index):
+    """Integer core of engineer_mark and engineer_mark_node: mark (direction, index)
+    in the `marked` mask and apply the overload rules. `index` must be 0..5. Returns (new_mask, events)."""
+    node = DIR_OFFSET[direction] + index
+    marked |= 1 << node
     events = []
 
     # Check circuits first (circuit completion clears only circuit nodes, no damage)
-    circuit_id = board[direction][index]["circuit"]
+    circuit_id = NODE_CIRCUIT[node]
     if circuit_id is not None:
-        circuit_nodes = CIRCUITS[circuit_id]
-        if all(board[d][i]["marked"] for d, i in circuit_nodes):
-            for d, i in circuit_nodes:
-                board[d][i]["marked"] = False
-            events.append({"type": "circuit_cleared", "circuit": circuit_id})
+        circuit_mask = CIRCUIT_MASK[circuit_id]
+        if marked & circuit_mask == circuit_mask:
+            marked &= ~circuit_mask
+            events.append({"type": EV_CIRCUIT_CLEARED, "circuit": circuit_id})
 
     # Check radiation (after circuit processing, so cleared circuit nodes don't count)
-    total_radiation = sum(
-        1 for d, i in RADIATION_NODES if board[d][i]["marked"]
-    )
-    if total_radiation >= len(RADIATION_NODES):
+    if marked & RADIATION_MASK == RADIATION_MASK:
         # RULEBOOK: clear ENTIRE board on radiation damage
-        clear_engineering_board(board)
-        events.append({"type": "radiation_damage", "damage": 1})
-        return events   # direction overload can't fire after full clear
+        events.append({"type": EV_RADIATION_DAMAGE, "damage": 1})
+        return 0, events   # direction overload can't fire after full clear
 
     # Check direction overload (all 6 nodes in current direction filled → damage + clear ALL)
-    if all(n["marked"] for n in board[direction]):
+    direction_mask = DIRECTION_MASK[direction]
+    if marked & direction_mask == direction_mask:
         # RULEBOOK: clear ENTIRE board on direction damage
-        clear_engineering_board(board)
-        events.append({"type": "direction_damage", "direction": direction, "damage": 1})
+        events.append({"type": EV_DIRECTION_DAMAGE, "direction": direction, "damage": 1})
+        return 0, events
 
+    return marked, events
+
+
+def engineer_mark_node(board, direction, index):
+    """
+    Mark node at (direction, index) on a standalone board dict (make_engineering_board).
+    A submarine's board is marked through engineer_mark instead.
+    Returns a list of events: [{"type": ..., ...}]
+
+    RULEBOOK:
+    - Circuit completed (C1/C2/C3) → clear those 4 nodes only, no damage.
+    - Direction overload (all 6 nodes in one section) → 1 damage + clear ENTIRE board.
+    - Radiation overload (all 4 radiation nodes) → 1 damage + clear ENTIRE board.
+    """
+    if not 0 <= index < NODES_PER_DIRECTION:
+        return [{"type": EV_ERROR, "msg": "Invalid node"}]
+    if board[direction][index]["marked"]:
+        return [{"type": EV_ERROR, "msg": "Node already marked"}]
+
+    old = board_bits(board)
+    new, events = _mark_bits(old, direction, index)
+    _sync_board(board, old, new)
     return events
 
 
@@ -192,16 +312,18 @@ def get_available_nodes(board, direction):
     return [i for i, n in enumerate(board[direction]) if not n["marked"]]
 
 
-def is_system_blocked(board, system):
+def is_system_blocked(sub, system):
     """Return True if any engineer node for this system is currently marked."""
-    target_color = SYSTEM_COLORS.get(system)
-    if not target_color:
-        return False
-    for direction, nodes in board.items():
-        for node in nodes:
-            if node["color"] == target_color and node["marked"]:
-                return True
-    return False
+    return bool(sub["blocked"] & SYSTEM_BIT.get(system, 0))
+
+
+def _blocked_systems(marked):
+    """Return the SYSTEM_BIT mask of systems blocked by a NODE_BIT mask of marked nodes."""
+    blocked = 0
+    for color_mask, systems in _BLOCKING:
+        if marked & color_mask:
+            blocked |= systems
+    return blocked
 
 
 # ── Submarine State ────────────────────────────────────────────────────────────
@@ -209,13 +331,18 @@ def is_system_blocked(board, system):
 def make_submarine(team):
     return {
         "team":     team,
-        "position": None,        # [row, col] or None
+        "position": None,        # (row, col) or None
         "health":   4,
-        "trail":    [],           # list of [row, col] visited (excluding current position trail lines)
-        "mines":    [],           # list of [row, col]
-        "systems":  {sys: 0 for sys in SYSTEM_MAX_CHARGE},
-        "engineering": make_engineering_board(),
+        "trail":    [],           # list of (row, col) tuples visited (excluding current position trail lines)
+        "mines":    [],           # list of (row, col) tuples
+        "trail_set": set(),       # (row, col) cells of trail, for membership tests
+        "mines_set": set(),       # (row, col) cells holding one of this team's mines
+        "systems":  dict.fromkeys(SYSTEM_NAMES, 0),   # written only through set_charge
+        "full":     0,            # SYSTEM_BIT mask of systems at max charge (see set_charge)
+        "eng_marked": 0,          # NODE_BIT mask of marked nodes (see engineering_view)
+        "blocked":  0,            # SYSTEM_BIT mask, refreshed whenever the engineering board changes
         "surfaced": False,        # True while surfacing (not yet dived)
+        "visible_sector": None,   # sector announced to the enemy while surfaced, else None
     }
 
 
@@ -223,11 +350,11 @@ def make_submarine(team):
 
 def make_game(map_key="alpha"):
     map_def = MAPS[map_key]
-    island_set = set(tuple(p) for p in map_def["islands"])
     return {
         "map_key":    map_key,
         "map":        map_def,
-        "island_set": island_set,
+        "island_set": map_def["island_set"],
+        "open_water": map_def["open_water"],   # open_water[r][c]: not an island (read-only)
         "phase":      "placement",   # placement | playing | ended
         "turn_index": 0,
         "turn_order": ["blue", "red"],
@@ -238,9 +365,13 @@ def make_game(map_key="alpha"):
             "red":  make_submarine("red"),
         },
         "turn_state": make_turn_state(),
-        "log":        [],
+        "log":        deque(maxlen=LOG_MAX),
         "winner":     None,
         "pending":    {},   # pending sonar/drone queries
+        "rev":        0,    # bumped on every state change; keys the serialize_game cache
+        "_views":     {},   # perspective_team -> serialized view, valid for rev "_views_rev"
+        "_sub_views": {},   # (hidden, team) -> submarine view shared by those perspectives
+        "_views_rev": 0,
     }
 
 
@@ -259,31 +390,79 @@ def make_turn_state():
 
 
 def current_team(game):
-    """Return the team whose turn it currently is."""
+    """Return the team whose turn it currently is.
+    game["active_team"] is kept current by end_turn, so code in this module
+    reads it directly instead of calling this."""
     return game["active_team"]
 
 
 def other_team(team):
-    return "red" if team == "blue" else "blue"
+    return OPPONENT[team]
+
+
+def mark_changed(game):
+    """Invalidate cached serialize_game views. The action functions below do this
+    themselves; call it after modifying the game dict directly."""
+    game["rev"] += 1
+
+
+def _changes_state(fn):
+    """Decorator for actions that may mutate `game` (their first argument).
+    Actions return a tuple starting with ok and reject a call before touching the
+    game, so only a successful call bumps the revision."""
+    @functools.wraps(fn)
+    def wrapper(game, *args, **kwargs):
+        result = fn(game, *args, **kwargs)
+        if result[0]:
+            game["rev"] += 1
+        return result
+    return wrapper
+
+
+# Preconditions checked by _guard, in this order
+G_PLAYING     = 1    # game phase is "playing"
+G_TURN        = 2    # it is this team's turn
+G_MOVED       = 4    # captain has already moved/surfaced this turn
+G_NOT_MOVED   = 8    # captain has not moved yet this turn
+G_NOT_WAITING = 16   # no sonar/drone response is pending
+G_SYSTEM_FREE = 32   # no system has been activated this turn
+
+# Preconditions shared by every system activation (torpedo/mine/sonar/drone/stealth)
+G_SYSTEM = G_PLAYING | G_TURN | G_SYSTEM_FREE
+
+
+def _guard(game, team, checks):
+    """Check the turn preconditions selected by `checks` (an OR of G_* flags).
+    Returns the error message of the first failing check, or None."""
+    ts = game["turn_state"]
+    if checks & G_PLAYING and game["phase"] != "playing":
+        return "Game not active"
+    if checks & G_TURN and game["active_team"] != team:
+        return "Not your turn"
+    if checks & G_MOVED and not ts["moved"]:
+        return "Captain hasn't moved yet"
+    if checks & G_NOT_MOVED and ts["moved"]:
+        return "Already moved this turn"
+    if checks & G_NOT_WAITING and ts["waiting_for"]:
+        return "Waiting for a response"
+    if checks & G_SYSTEM_FREE and ts["system_used"]:
+        return "Already used a system this turn"
+    return None
 
 
 def is_valid_position(game, row, col):
     map_def = game["map"]
-    if row < 0 or row >= map_def["rows"]:
-        return False
-    if col < 0 or col >= map_def["cols"]:
-        return False
-    if (row, col) in game["island_set"]:
-        return False
-    return True
+    return (0 <= row < map_def["rows"] and 0 <= col < map_def["cols"]
+            and game["open_water"][row][col])
 
 
 def direction_delta(direction):
-    return {"north": (-1, 0), "south": (1, 0), "west": (0, -1), "east": (0, 1)}[direction]
+    return DIRECTION_DELTA[direction]
 
 
 # ── Placement ─────────────────────────────────────────────────────────────────
 
+@_changes_state
 def place_submarine(game, team, row, col):
     """Place a submarine. Returns (ok, error_msg)."""
     if game["phase"] != "placement":
@@ -293,8 +472,9 @@ def place_submarine(game, team, row, col):
         return False, "Already placed"
     if not is_valid_position(game, row, col):
         return False, "Invalid position"
-    sub["position"] = [row, col]
-    sub["trail"] = [[row, col]]
+    sub["position"] = (row, col)
+    sub["trail"] = [(row, col)]
+    sub["trail_set"] = {(row, col)}
     game["log"].append({"type": "placed", "team": team, "row": row, "col": col})
     # Check if both placed
     if all(game["submarines"][t]["position"] is not None for t in TEAMS):
@@ -304,47 +484,47 @@ def place_submarine(game, team, row, col):
 
 # ── Movement ──────────────────────────────────────────────────────────────────
 
+@_changes_state
 def captain_move(game, team, direction):
     """Move the submarine. Returns (ok, error_msg, events)."""
-    if game["phase"] != "playing":
-        return False, "Game not active", []
-    if current_team(game) != team:
-        return False, "Not your turn", []
-    if game["turn_state"]["moved"]:
-        return False, "Already moved this turn", []
-    if game["turn_state"]["waiting_for"]:
-        return False, "Waiting for a response", []
+    err = _guard(game, team, G_PLAYING | G_TURN | G_NOT_MOVED | G_NOT_WAITING)
+    if err:
+        return False, err, []
 
     sub = game["submarines"][team]
     if sub["surfaced"]:
         return False, "Submarine is surfaced – press DIVE first", []
 
-    dr, dc = direction_delta(direction)
+    delta = DIRECTION_DELTA.get(direction)
+    if delta is None:
+        return False, f"Invalid direction: {direction}", []
     r, c = sub["position"]
-    nr, nc = r + dr, c + dc
+    nr, nc = r + delta[0], c + delta[1]
 
     if not is_valid_position(game, nr, nc):
         return False, "Invalid move (boundary or island)", []
 
     # Can't revisit – trail includes starting position
-    if [nr, nc] in sub["trail"]:
+    if (nr, nc) in sub["trail_set"]:
         return False, "Cannot revisit a cell (you've been there before)", []
 
     # RULEBOOK: Cannot move into own mine
-    if [nr, nc] in sub["mines"]:
+    if (nr, nc) in sub["mines_set"]:
         return False, "Cannot move into own mine", []
 
     # Move
-    sub["position"] = [nr, nc]
-    sub["trail"].append([nr, nc])
+    sub["position"] = (nr, nc)
+    sub["trail"].append((nr, nc))
+    sub["trail_set"].add((nr, nc))
     game["turn_state"]["moved"] = True
     game["turn_state"]["direction"] = direction
 
-    events = [{"type": "moved", "team": team, "direction": direction, "row": nr, "col": nc}]
+    events = [{"type": EV_MOVED, "team": team, "direction": direction, "row": nr, "col": nc}]
     game["log"].append({"type": "move", "team": team, "direction": direction})
     return True, None, events
 
 
+@_changes_state
 def captain_surface(game, team):
     """
     Surface the submarine. Returns (ok, error_msg, events).
@@ -355,10 +535,9 @@ def captain_surface(game, team):
     - Announces sector to all.
     - Enemy team gets 3 free turns (surface bonus).
     """
-    if game["phase"] != "playing":
-        return False, "Game not active", []
-    if current_team(game) != team:
-        return False, "Not your turn", []
+    err = _guard(game, team, G_PLAYING | G_TURN)
+    if err:
+        return False, err, []
     if game["turn_state"]["moved"]:
         return False, "Already acted this turn", []
     if game["turn_state"]["waiting_for"]:
@@ -366,20 +545,22 @@ def captain_surface(game, team):
 
     sub = game["submarines"][team]
     r, c = sub["position"]
-    sector = get_sector(r, c, game["map"]["sector_size"], game["map"]["cols"])
+    sector = game["map"]["sector_table"][r][c]
 
     # No damage from surfacing (rulebook)
-    sub["trail"] = [[r, c]]   # clear trail (keep current position)
+    sub["trail"] = [(r, c)]   # clear trail (keep current position)
+    sub["trail_set"] = {(r, c)}
     sub["surfaced"] = True
+    sub["visible_sector"] = sector
 
     # RULEBOOK: clear entire engineering board when surfacing
-    clear_engineering_board(sub["engineering"])
+    clear_engineering_board(sub)
 
     # RULEBOOK: enemy team gets 3 bonus turns after surfacing
-    enemy = other_team(team)
+    enemy = OPPONENT[team]
     game["surface_bonus"] = {"for_team": enemy, "turns_remaining": 3}
 
-    events = [{"type": "surfaced", "team": team, "sector": sector, "health": sub["health"]}]
+    events = [{"type": EV_SURFACED, "team": team, "sector": sector, "health": sub["health"]}]
     game["log"].append({"type": "surface", "team": team, "sector": sector})
 
     game["turn_state"]["moved"] = True
@@ -390,26 +571,29 @@ def captain_surface(game, team):
     return True, None, events
 
 
+@_changes_state
 def captain_dive(game, team):
     """Dive after surfacing. Must be this team's turn."""
-    if current_team(game) != team:
-        return False, "Not your turn"
+    err = _guard(game, team, G_TURN)
+    if err:
+        return False, err
     sub = game["submarines"][team]
     if not sub["surfaced"]:
         return False, "Not surfaced"
     sub["surfaced"] = False
+    sub["visible_sector"] = None
     return True, None
 
 
 # ── Engineer ──────────────────────────────────────────────────────────────────
 
+@_changes_state
 def engineer_mark(game, team, direction, index):
     """Mark an engineering node. Returns (ok, error_msg, events, damage).
     RULEBOOK stealth: engineer must mark one node in the stealth direction (private)."""
-    if current_team(game) != team:
-        return False, "Not your turn", [], 0
-    if not game["turn_state"]["moved"]:
-        return False, "Captain hasn't moved yet", [], 0
+    err = _guard(game, team, G_TURN | G_MOVED)
+    if err:
+        return False, err, [], 0
     ts = game["turn_state"]
     # Determine required direction (public move direction, or private stealth direction)
     effective_dir = ts["direction"] if ts["direction"] is not None else ts.get("stealth_direction")
@@ -420,29 +604,33 @@ def engineer_mark(game, team, direction, index):
     if direction != effective_dir:
         return False, f"Must mark in the {effective_dir} section", [], 0
 
-    board = game["submarines"][team]["engineering"]
-    if board[direction][index]["marked"]:
+    if not 0 <= index < NODES_PER_DIRECTION:
+        return False, "Invalid node", [], 0
+    sub = game["submarines"][team]
+    old = sub["eng_marked"]
+    if old & 1 << (DIR_OFFSET[direction] + index):
         return False, "Node already marked", [], 0
 
-    eng_events = engineer_mark_node(board, direction, index)
+    new, eng_events = _mark_bits(old, direction, index)
+    sub["eng_marked"] = new
+    sub["blocked"] = _blocked_systems(new)
     game["turn_state"]["engineer_done"] = True
 
     total_damage = 0
     out_events = []
-    sub = game["submarines"][team]
 
     for ev in eng_events:
-        if ev["type"] in ("radiation_damage", "direction_damage"):
+        if ev["type"] in (EV_RADIATION_DAMAGE, EV_DIRECTION_DAMAGE):
             dmg = ev["damage"]
             sub["health"] -= dmg
             total_damage += dmg
-            out_events.append({"type": "engineering_damage", "team": team,
+            out_events.append({"type": EV_ENGINEERING_DAMAGE, "team": team,
                                 "cause": ev["type"], "damage": dmg, "health": sub["health"],
                                 "direction": ev.get("direction")})
         else:
-            out_events.append({"type": "circuit_cleared", "team": team, "circuit": ev.get("circuit")})
+            out_events.append({"type": EV_CIRCUIT_CLEARED, "team": team, "circuit": ev.get("circuit")})
 
-    result = _check_game_over(game)
+    result = _check_game_over(game, team)
     if result:
         out_events.append(result)
 
@@ -451,13 +639,13 @@ def engineer_mark(game, team, direction, index):
 
 # ── First Mate ────────────────────────────────────────────────────────────────
 
+@_changes_state
 def first_mate_charge(game, team, system):
     """Charge a system. Returns (ok, error_msg, events).
     RULEBOOK stealth: FM still charges one system on a stealth move."""
-    if current_team(game) != team:
-        return False, "Not your turn", []
-    if not game["turn_state"]["moved"]:
-        return False, "Captain hasn't moved yet", []
+    err = _guard(game, team, G_TURN | G_MOVED)
+    if err:
+        return False, err, []
     ts = game["turn_state"]
     # Allow charging on normal moves AND stealth moves (not on surface)
     effective_dir = ts["direction"] if ts["direction"] is not None else ts.get("stealth_direction")
@@ -465,100 +653,118 @@ def first_mate_charge(game, team, system):
         return False, "No charging when surfacing", []
     if ts["first_mate_done"]:
         return False, "Already charged this turn", []
-    if system not in SYSTEM_MAX_CHARGE:
+    max_c = SYSTEM_MAX_CHARGE.get(system)
+    if max_c is None:
         return False, f"Unknown system: {system}", []
 
     sub = game["submarines"][team]
-    max_c = SYSTEM_MAX_CHARGE[system]
     current = sub["systems"][system]
 
     if current >= max_c:
         return False, f"{system} already fully charged", []
 
-    sub["systems"][system] = current + 1
-    game["turn_state"]["first_mate_done"] = True
+    new_val = current + 1
+    set_charge(sub, system, new_val)
+    ts["first_mate_done"] = True
 
-    new_val = sub["systems"][system]
-    events = [{"type": "system_charged", "team": team, "system": system,
+    events = [{"type": EV_SYSTEM_CHARGED, "team": team, "system": system,
                "charge": new_val, "max": max_c, "ready": new_val >= max_c}]
     return True, None, events
 
 
 # ── Weapons & Systems ─────────────────────────────────────────────────────────
 
-def _check_charge(sub, system):
-    return sub["systems"][system] >= SYSTEM_MAX_CHARGE[system]
+def _check_charge(sub, system, _max=SYSTEM_MAX_CHARGE):
+    return sub["systems"][system] >= _max[system]
+
+
+def _system_ready(sub, system, _max=SYSTEM_MAX_CHARGE, _bit=SYSTEM_BIT):
+    """True if `system` is fully charged and not blocked by the engineering board."""
+    return (sub["systems"][system] >= _max[system]
+            and not sub["blocked"] & _bit[system])
+
+
+def set_charge(sub, system, value):
+    """Set a system's charge and keep sub["full"] in step with it. The actions below
+    charge and drain systems only through here; set charges from outside the same way,
+    not by assigning sub["systems"], or the full mask goes stale."""
+    sub["systems"][system] = value
+    if value >= SYSTEM_MAX_CHARGE[system]:
+        sub["full"] |= SYSTEM_BIT[system]
+    else:
+        sub["full"] &= ~SYSTEM_BIT[system]
 
 
 def _use_system(sub, system):
-    sub["systems"][system] = 0
+    set_charge(sub, system, 0)
+
+
+def _system_failure(game, team):
+    """Activating an unavailable system costs 1 damage and uses up the turn's system.
+    Returns the events to report."""
+    sub = game["submarines"][team]
+    sub["health"] -= 1
+    game["turn_state"]["system_used"] = True
+    events = [{"type": EV_DAMAGE, "team": team, "amount": 1,
+               "health": sub["health"], "cause": "system_failure"}]
+    result = _check_game_over(game, team)
+    if result:
+        events.append(result)
+    return events
 
 
 def has_valid_move(game, team):
     """Return True if the submarine has at least one legal direction to move."""
     sub = game["submarines"][team]
-    r, c = sub["position"]
-    for direction in ("north", "south", "east", "west"):
-        dr, dc = direction_delta(direction)
-        nr, nc = r + dr, c + dc
-        if is_valid_position(game, nr, nc) and [nr, nc] not in sub["trail"] and [nr, nc] not in sub["mines"]:
+    trail_set, mines_set = sub["trail_set"], sub["mines_set"]
+    for _, nr, nc in game["map"]["neighbors"][sub["position"]]:
+        if (nr, nc) not in trail_set and (nr, nc) not in mines_set:
             return True
     return False
 
 
+@_changes_state
 def captain_fire_torpedo(game, team, target_row, target_col):
     """Fire a torpedo. Returns (ok, error_msg, events).
     If system unavailable: takes 1 damage instead of firing.
     RULEBOOK: torpedo destroys (without exploding) any mine at the impact cell."""
-    if current_team(game) != team:
-        return False, "Not your turn", []
-    if game["phase"] != "playing":
-        return False, "Game not active", []
-    if game["turn_state"]["system_used"]:
-        return False, "Already used a system this turn", []
+    err = _guard(game, team, G_SYSTEM)
+    if err:
+        return False, err, []
     if not is_valid_position(game, target_row, target_col):
         return False, "Invalid target", []
 
     sub = game["submarines"][team]
-    r, c = sub["position"]
-    dist = abs(target_row - r) + abs(target_col - c)
-    if dist > 4 or dist == 0:
+    if (target_row, target_col) not in game["map"]["torpedo_reach"][sub["position"]]:
         return False, "Torpedo range: 1–4 spaces (Manhattan distance)", []
 
     # System unavailable (not charged or blocked) → 1 damage, no shot
-    if not _check_charge(sub, "torpedo") or is_system_blocked(sub["engineering"], "torpedo"):
-        sub["health"] -= 1
-        game["turn_state"]["system_used"] = True
-        events = [{"type": "damage", "team": team, "amount": 1,
-                   "health": sub["health"], "cause": "system_failure"}]
-        result = _check_game_over(game)
-        if result:
-            events.append(result)
-        return True, "System unavailable — took 1 damage", events
+    if not _system_ready(sub, "torpedo"):
+        return True, "System unavailable — took 1 damage", _system_failure(game, team)
 
     _use_system(sub, "torpedo")
     game["turn_state"]["system_used"] = True
 
     # RULEBOOK: torpedo destroys (without exploding) any mine at the impact cell
     for t, s in game["submarines"].items():
-        before = len(s["mines"])
-        s["mines"] = [m for m in s["mines"] if m != [target_row, target_col]]
-        if len(s["mines"]) < before:
+        if (target_row, target_col) in s["mines_set"]:
+            s["mines"] = [m for m in s["mines"] if m != (target_row, target_col)]
+            s["mines_set"].discard((target_row, target_col))
             game["log"].append({"type": "mine_destroyed_by_torpedo",
                                  "team": t, "row": target_row, "col": target_col})
 
-    events = [{"type": "torpedo_fired", "team": team, "row": target_row, "col": target_col}]
+    events = [{"type": EV_TORPEDO_FIRED, "team": team, "row": target_row, "col": target_col}]
     events += _apply_explosion(game, team, target_row, target_col)
     game["log"].append({"type": "torpedo", "team": team, "row": target_row, "col": target_col})
     return True, None, events
 
 
+@_changes_state
 def captain_place_mine(game, team, target_row, target_col):
     """Place a mine on an adjacent cell (incl. diagonal). Returns (ok, error_msg, events)."""
-    if current_team(game) != team:
-        return False, "Not your turn", []
-    if game["turn_state"]["system_used"]:
-        return False, "Already used a system this turn", []
+    err = _guard(game, team, G_SYSTEM)
+    if err:
+        return False, err, []
     if not is_valid_position(game, target_row, target_col):
         return False, "Invalid target", []
 
@@ -570,35 +776,29 @@ def captain_place_mine(game, team, target_row, target_col):
         return False, "Mine must be placed on an adjacent cell (including diagonal)", []
 
     # Can't place on route (trail lines) – rulebook explicit
-    if [target_row, target_col] in sub["trail"]:
+    if (target_row, target_col) in sub["trail_set"]:
         return False, "Cannot place mine on a cell already in your route", []
 
     # System unavailable (not charged or blocked) → 1 damage, no mine placed
-    if not _check_charge(sub, "mine") or is_system_blocked(sub["engineering"], "mine"):
-        sub["health"] -= 1
-        game["turn_state"]["system_used"] = True
-        events = [{"type": "damage", "team": team, "amount": 1,
-                   "health": sub["health"], "cause": "system_failure"}]
-        result = _check_game_over(game)
-        if result:
-            events.append(result)
-        return True, "System unavailable — took 1 damage", events
+    if not _system_ready(sub, "mine"):
+        return True, "System unavailable — took 1 damage", _system_failure(game, team)
 
     _use_system(sub, "mine")
     game["turn_state"]["system_used"] = True
-    sub["mines"].append([target_row, target_col])
-    events = [{"type": "mine_placed", "team": team}]
+    sub["mines"].append((target_row, target_col))
+    sub["mines_set"].add((target_row, target_col))
+    events = [{"type": EV_MINE_PLACED, "team": team}]
     game["log"].append({"type": "mine_placed", "team": team})
     return True, None, events
 
 
+@_changes_state
 def captain_detonate_mine(game, team, mine_index):
     """Detonate one of the team's own mines. Returns (ok, error_msg, events).
     RULEBOOK: can only detonate on own turn; cannot detonate while surfaced."""
-    if game["phase"] != "playing":
-        return False, "Game not active", []
-    if current_team(game) != team:
-        return False, "Not your turn", []
+    err = _guard(game, team, G_PLAYING | G_TURN)
+    if err:
+        return False, err, []
     sub = game["submarines"][team]
     # RULEBOOK: "At any time, except while surfaced, the Captain can trigger a mine"
     if sub["surfaced"]:
@@ -607,7 +807,9 @@ def captain_detonate_mine(game, team, mine_index):
         return False, "Invalid mine index", []
 
     mine = sub["mines"].pop(mine_index)
-    events = [{"type": "mine_detonated", "team": team, "row": mine[0], "col": mine[1]}]
+    if mine not in sub["mines"]:   # the same cell may hold two mines
+        sub["mines_set"].discard(mine)
+    events = [{"type": EV_MINE_DETONATED, "team": team, "row": mine[0], "col": mine[1]}]
     events += _apply_explosion(game, team, mine[0], mine[1])
     game["log"].append({"type": "mine_detonated", "team": team, "row": mine[0], "col": mine[1]})
     return True, None, events
@@ -617,28 +819,28 @@ def _apply_explosion(game, firing_team, target_row, target_col):
     """Apply torpedo/mine explosion damage. Friendly fire included."""
     events = []
     for team, sub in game["submarines"].items():
-        if sub["position"] is None:
+        pos = sub["position"]
+        if pos is None:
             continue
-        r, c = sub["position"]
-        dist = abs(target_row - r) + abs(target_col - c)
-        if dist == 0:
-            dmg = 2
-        elif dist == 1:
-            dmg = 1
-        else:
+        dist = abs(target_row - pos[0]) + abs(target_col - pos[1])
+        if dist > 1:
             continue
-        sub["health"] -= dmg
-        events.append({"type": "damage", "team": team, "amount": dmg,
-                        "health": sub["health"], "cause": "explosion",
+        dmg = 2 - dist
+        health = sub["health"] = sub["health"] - dmg
+        events.append({"type": EV_DAMAGE, "team": team, "amount": dmg,
+                        "health": health, "cause": "explosion",
                         "row": target_row, "col": target_col})
-        result = _check_game_over(game)
-        if result:
-            events.append(result)
+        if health <= 0:
+            # Keep going after a sinking: the other sub may be hit by the same blast
+            result = _check_game_over(game, team)
+            if result:
+                events.append(result)
     return events
 
 
 # ── Sonar (interactive) ────────────────────────────────────────────────────────
 
+@_changes_state
 def captain_use_sonar(game, team):
     """
     Activate sonar. Sets waiting_for='sonar_response' so enemy captain must respond.
@@ -646,14 +848,13 @@ def captain_use_sonar(game, team):
     The activating team sees the enemy's stated info (NOT server-computed truth).
     Returns (ok, error_msg, events)
     """
-    if current_team(game) != team:
-        return False, "Not your turn", []
-    if game["turn_state"]["system_used"]:
-        return False, "Already used a system this turn", []
+    err = _guard(game, team, G_SYSTEM)
+    if err:
+        return False, err, []
     sub = game["submarines"][team]
     if not _check_charge(sub, "sonar"):
         return False, "Sonar not charged", []
-    if is_system_blocked(sub["engineering"], "sonar"):
+    if sub["blocked"] & SYSTEM_BIT["sonar"]:
         return False, "Sonar blocked by engineer breakdown (green nodes marked)", []
 
     _use_system(sub, "sonar")
@@ -661,13 +862,14 @@ def captain_use_sonar(game, team):
     game["turn_state"]["waiting_for"] = "sonar_response"
 
     events = [
-        {"type": "sonar_activated", "team": team},
-        {"type": "sonar_announced", "team": team},
+        {"type": EV_SONAR_ACTIVATED, "team": team},
+        {"type": EV_SONAR_ANNOUNCED, "team": team},
     ]
     game["log"].append({"type": "sonar", "team": team})
     return True, None, events
 
 
+@_changes_state
 def captain_respond_sonar(game, responding_team, type1, val1, type2, val2):
     """
     Enemy captain responds to sonar query.
@@ -675,11 +877,11 @@ def captain_respond_sonar(game, responding_team, type1, val1, type2, val2):
     responding_team: the team that is responding (NOT the activating team).
     Returns (ok, error_msg, events)
     """
-    activating_team = other_team(responding_team)
+    activating_team = OPPONENT[responding_team]
 
     if game["turn_state"]["waiting_for"] != "sonar_response":
         return False, "No sonar query is pending", []
-    if current_team(game) != activating_team:
+    if game["active_team"] != activating_team:
         return False, "Sonar query is not active", []
 
     # Validate types
@@ -692,8 +894,7 @@ def captain_respond_sonar(game, responding_team, type1, val1, type2, val2):
     # Determine truth using responding team's actual position
     enemy_sub = game["submarines"][responding_team]
     er, ec = enemy_sub["position"]
-    map_def = game["map"]
-    actual_sector = get_sector(er, ec, map_def["sector_size"], map_def["cols"])
+    actual_sector = game["map"]["sector_table"][er][ec]
 
     def is_true(t, v):
         if t == "row":    return er == v
@@ -713,7 +914,7 @@ def captain_respond_sonar(game, responding_team, type1, val1, type2, val2):
     game["turn_state"]["waiting_for"] = None
 
     events = [
-        {"type": "sonar_result",
+        {"type": EV_SONAR_RESULT,
          "target": activating_team,
          "type1": type1, "val1": val1,
          "type2": type2, "val2": val2},
@@ -721,41 +922,39 @@ def captain_respond_sonar(game, responding_team, type1, val1, type2, val2):
     return True, None, events
 
 
+@_changes_state
 def captain_use_drone(game, team, ask_sector):
     """
     Use drone: ask if enemy is in a sector.
     Returns (ok, error_msg, events)
     """
-    if current_team(game) != team:
-        return False, "Not your turn", []
-    if game["turn_state"]["system_used"]:
-        return False, "Already used a system this turn – move first", []
+    err = _guard(game, team, G_SYSTEM)
+    if err:
+        return False, err, []
     sub = game["submarines"][team]
     if not _check_charge(sub, "drone"):
         return False, "Drone not charged", []
-    if is_system_blocked(sub["engineering"], "drone"):
+    if sub["blocked"] & SYSTEM_BIT["drone"]:
         return False, "Drone blocked by engineer breakdown (green nodes marked)", []
 
-    enemy_team = other_team(team)
-    enemy_sub = game["submarines"][enemy_team]
+    enemy_sub = game["submarines"][OPPONENT[team]]
     er, ec = enemy_sub["position"]
-    map_def = game["map"]
-    sector_size = map_def["sector_size"]
-    actual_sector = get_sector(er, ec, sector_size, map_def["cols"])
+    actual_sector = game["map"]["sector_table"][er][ec]
 
     in_sector = (actual_sector == ask_sector)
 
     _use_system(sub, "drone")
     game["turn_state"]["system_used"] = True
     events = [
-        {"type": "drone_used", "team": team, "ask_sector": ask_sector},
-        {"type": "drone_result", "target": team, "in_sector": in_sector, "ask_sector": ask_sector},
-        {"type": "drone_announced", "team": team, "sector": ask_sector},
+        {"type": EV_DRONE_USED, "team": team, "ask_sector": ask_sector},
+        {"type": EV_DRONE_RESULT, "target": team, "in_sector": in_sector, "ask_sector": ask_sector},
+        {"type": EV_DRONE_ANNOUNCED, "team": team, "sector": ask_sector},
     ]
     game["log"].append({"type": "drone", "team": team})
     return True, None, events
 
 
+@_changes_state
 def captain_use_stealth(game, team, direction, steps):
     """
     Use stealth (Silence): move 0-4 cells in a STRAIGHT LINE silently.
@@ -765,69 +964,62 @@ def captain_use_stealth(game, team, direction, steps):
     If system unavailable: takes 1 damage instead of moving.
     Returns (ok, error_msg, events)
     """
-    if current_team(game) != team:
-        return False, "Not your turn", []
-    if game["turn_state"]["moved"]:
-        return False, "Already moved this turn", []
-    if game["turn_state"]["system_used"]:
-        return False, "Already used a system this turn", []
-    if direction not in ("north", "south", "east", "west"):
+    err = _guard(game, team, G_SYSTEM | G_NOT_MOVED)
+    if err:
+        return False, err, []
+    if direction not in DIRECTION_DELTA:
         return False, f"Invalid direction: {direction}", []
     if not isinstance(steps, int) or steps < 0 or steps > 4:
         return False, "Stealth: steps must be 0–4", []
 
     sub = game["submarines"][team]
+    ts = game["turn_state"]
 
     # System unavailable → 1 damage, no movement
-    if not _check_charge(sub, "stealth") or is_system_blocked(sub["engineering"], "stealth"):
-        sub["health"] -= 1
-        game["turn_state"]["system_used"] = True
-        game["turn_state"]["moved"] = True
-        game["turn_state"]["direction"] = None
-        game["turn_state"]["engineer_done"] = True
-        game["turn_state"]["first_mate_done"] = True
-        events = [{"type": "damage", "team": team, "amount": 1,
-                   "health": sub["health"], "cause": "system_failure"}]
-        result = _check_game_over(game)
-        if result:
-            events.append(result)
-        return True, "System unavailable — took 1 damage", events
+    if not _system_ready(sub, "stealth"):
+        ts["moved"] = True
+        ts["direction"] = None
+        ts["engineer_done"] = True
+        ts["first_mate_done"] = True
+        return True, "System unavailable — took 1 damage", _system_failure(game, team)
 
     # Validate straight-line path
+    # A straight line never crosses itself, so only the existing trail and mines matter
     r, c = sub["position"]
-    visited = set(tuple(pos) for pos in sub["trail"])
-    mines_set = set(tuple(m) for m in sub["mines"])
+    if steps > game["map"]["max_run"][direction][r][c]:
+        return False, "Invalid move during stealth (boundary or island)", []
+    trail_set, mines_set = sub["trail_set"], sub["mines_set"]
     path = []
-    dr, dc = direction_delta(direction)
+    dr, dc = DIRECTION_DELTA[direction]
     for _ in range(steps):
         r, c = r + dr, c + dc
-        if not is_valid_position(game, r, c):
-            return False, "Invalid move during stealth (boundary or island)", []
-        if (r, c) in visited:
+        if (r, c) in trail_set:
             return False, "Cannot revisit a cell during stealth", []
         if (r, c) in mines_set:
             return False, "Cannot move into own mine during stealth", []
-        visited.add((r, c))
-        path.append([r, c])
+        path.append((r, c))
 
     # Apply moves
     _use_system(sub, "stealth")
-    game["turn_state"]["system_used"] = True
-    for pos in path:
-        sub["position"] = pos
-        sub["trail"].append(pos)
-
-    game["turn_state"]["moved"] = True
-    game["turn_state"]["direction"] = None           # public direction stays hidden
-    game["turn_state"]["stealth_direction"] = direction  # private — only own team knows
+    ts["system_used"] = True
+    if path:
+        sub["position"] = path[-1]
+        if sub["surfaced"]:
+            sub["visible_sector"] = game["map"]["sector_table"][r][c]
+        sub["trail"].extend(path)
+        sub["trail_set"].update(path)
+
+    ts["moved"] = True
+    ts["direction"] = None           # public direction stays hidden
+    ts["stealth_direction"] = direction  # private — only own team knows
     # RULEBOOK: engineer still marks 1 node in the stealth direction,
     # and FM still charges 1 system on a stealth move.
     # Do NOT set engineer_done or first_mate_done — they must still act.
 
+    r, c = sub["position"]
     events = [
-        {"type": "stealth_used", "team": team, "steps": steps, "direction": direction},
-        {"type": "moved_private", "team": team,
-         "row": sub["position"][0], "col": sub["position"][1]},
+        {"type": EV_STEALTH_USED, "team": team, "steps": steps, "direction": direction},
+        {"type": EV_MOVED_PRIVATE, "team": team, "row": r, "col": c},
     ]
     game["log"].append({"type": "stealth", "team": team, "steps": steps})
     return True, None, events
@@ -837,24 +1029,27 @@ def captain_use_stealth(game, team, direction, steps):
 
 def can_end_turn(game, team):
     """Check if the active captain can end their turn."""
+    err = _guard(game, team, G_TURN)
+    if err:
+        return False, err
     ts = game["turn_state"]
-    if current_team(game) != team:
-        return False, "Not your turn"
     if not ts["moved"]:
         return False, "Must move or surface before ending turn"
     if ts["waiting_for"]:
         return False, "Waiting for a response"
     # When a directional move OR stealth was used, engineer AND first mate must act first.
     # (Surface auto-sets both done flags so the check below is always satisfied there.)
-    has_direction = ts["direction"] is not None or ts.get("stealth_direction") is not None
+    # RULEBOOK: with every system fully charged the first mate has nothing to mark.
+    has_direction = ts["direction"] is not None or ts["stealth_direction"] is not None
     if has_direction:
         if not ts["engineer_done"]:
             return False, "Waiting for engineer to mark a node"
-        if not ts["first_mate_done"]:
+        if not ts["first_mate_done"] and game["submarines"][team]["full"] != ALL_SYSTEMS:
             return False, "Waiting for first mate to charge a system"
     return True, None
 
 
+@_changes_state
 def end_turn(game, team):
     """
     End the active team's turn. Returns (ok, error_msg, events).
@@ -878,93 +1073,154 @@ def end_turn(game, team):
             if sb["turns_remaining"] <= 0:
                 # Bonus exhausted — switch back to the surfaced team
                 game["surface_bonus"] = None
-                game["active_team"] = other_team(team)
+                game["active_team"] = OPPONENT[team]
             # else: bonus team continues (active_team stays the same)
         else:
             # The surfaced team ended their (surface) turn — give bonus to bonus team
             game["active_team"] = sb["for_team"]
     else:
         # Normal turn switch
-        game["active_team"] = other_team(team)
+        game["active_team"] = OPPONENT[team]
 
     game["turn_state"] = make_turn_state()
-    next_t = game["active_team"]
-    events = [{"type": "turn_end", "team": team},
-              {"type": "turn_start", "team": next_t}]
+    events = [{"type": EV_TURN_END, "team": team},
+              {"type": EV_TURN_START, "team": game["active_team"]}]
     return True, None, events
 
 
 # ── Game over check ───────────────────────────────────────────────────────────
 
-def _check_game_over(game):
-    for team, sub in game["submarines"].items():
-        if sub["health"] <= 0:
-            game["phase"] = "ended"
-            winner = "red" if team == "blue" else "blue"
-            game["winner"] = winner
-            return {"type": "game_over", "winner": winner, "loser": team}
-    return None
+def _check_game_over(game, team):
+    """Call right after `team` took damage. Ends the game and returns the
+    game_over event if that submarine sank (only the first sinking counts)."""
+    if game["submarines"][team]["health"] > 0 or game["phase"] == "ended":
+        return None
+    game["phase"] = "ended"
+    winner = OPPONENT[team]
+    game["winner"] = winner
+    return {"type": EV_GAME_OVER, "winner": winner, "loser": team}
 
 
 # ── Serialisation helpers ─────────────────────────────────────────────────────
 
+# System name → per-charge view entries, shared (read-only) by every serialized view
+_SYSTEM_STATES = {
+    name: tuple({"charge": v, "max": max_c, "ready": v >= max_c} for v in range(max_c + 1))
+    for name, max_c in zip(SYSTEM_NAMES, SYSTEM_MAX)
+}
+
+
+def _systems_view(charges):
+    return {name: states[charges[name]] for name, states in _SYSTEM_STATES.items()}
+
+
+def _own_view(team, sub):
+    """Full view of a submarine (own team / spectators). Containers the game
+    mutates in place are copied, so a view stays a snapshot of its revision."""
+    return {
+        "team":        team,
+        "health":      sub["health"],
+        "surfaced":    sub["surfaced"],
+        "systems":     _systems_view(sub["systems"]),
+        "mine_count":  len(sub["mines"]),
+        "position":    sub["position"],
+        "trail":       list(sub["trail"]),
+        "mines":       list(sub["mines"]),
+        "engineering": engineering_view(sub),
+    }
+
+
+# Private fields of an enemy submarine view
+_HIDDEN_SUB = {
+    "position":    None,
+    "trail":       None,
+    "mines":       None,
+    "engineering": None,
+}
+
+
+def _hidden_view(team, sub):
+    """Enemy view of a submarine: exact position hidden, sector revealed only when surfaced."""
+    return {
+        "team":        team,
+        "health":      sub["health"],
+        "surfaced":    sub["surfaced"],
+        "systems":     _systems_view(sub["systems"]),
+        "mine_count":  len(sub["mines"]),
+        **_HIDDEN_SUB,
+        "sector":      sub["visible_sector"],
+    }
+
+
 def serialize_game(game, perspective_team=None):
     """
     Serialize game state for sending to a client.
     If perspective_team is set, hide the OTHER team's exact position (only sector visible).
+    Views are cached until the next state change (see mark_changed); treat them as read-only.
     """
+    views = game["_views"]
+    if game["_views_rev"] != game["rev"]:
+        views.clear()
+        game["_sub_views"].clear()
+        game["_views_rev"] = game["rev"]
+    view = views.get(perspective_team)
+    if view is None:
+        view = views[perspective_team] = _build_view(game, perspective_team)
+    return view
+
+
+def _build_view(game, perspective_team):
     map_def = game["map"]
-    sector_size = map_def["sector_size"]
 
+    # A submarine's own and hidden views are the same for every perspective that
+    # sees it that way, so each is built once per revision
+    sub_views = game["_sub_views"]
     subs = {}
     for team, sub in game["submarines"].items():
-        is_own = (perspective_team == team)
-        s = {
-            "team":      team,
-            "health":    sub["health"],
-            "surfaced":  sub["surfaced"],
-            "systems":   {k: {"charge": v, "max": SYSTEM_MAX_CHARGE[k], "ready": v >= SYSTEM_MAX_CHARGE[k]}
-                          for k, v in sub["systems"].items()},
-            "mine_count": len(sub["mines"]),
-        }
-        if is_own or perspective_team is None:
-            s["position"] = sub["position"]
-            s["trail"]    = sub["trail"]
-            s["mines"]    = sub["mines"]
-            s["engineering"] = sub["engineering"]
-        else:
-            # Hide exact position; only reveal sector when surfaced
-            if sub["surfaced"] and sub["position"]:
-                r, c = sub["position"]
-                s["sector"] = get_sector(r, c, sector_size, map_def["cols"])
-            s["position"] = None
-            s["trail"]    = None
-            s["mines"]    = None
-            s["engineering"] = None
-        subs[team] = s
+        key = (perspective_team is not None and team != perspective_team, team)
+        view = sub_views.get(key)
+        if view is None:
+            view = sub_views[key] = (_hidden_view if key[0] else _own_view)(team, sub)
+        subs[team] = view
+
+    phase = game["phase"]
+    active = game["active_team"]
+    current = active if phase == "playing" else None
 
     # Build turn_state, hiding stealth_direction from the enemy team
-    ts = game["turn_state"]
-    if perspective_team is not None and perspective_team != current_team(game) and game["phase"] == "playing":
+    ts = dict(game["turn_state"])
+    if current is not None and perspective_team is not None and perspective_team != current:
         # Enemy team should not see the stealth direction
-        ts = dict(ts)
         ts["stealth_direction"] = None
+    sb = game["surface_bonus"]
 
     return {
-        "phase":         game["phase"],
+        "phase":         phase,
         "turn_index":    game["turn_index"],
-        "current_team":  current_team(game) if game["phase"] == "playing" else None,
-        "active_team":   game.get("active_team"),
-        "surface_bonus": game.get("surface_bonus"),
+        "current_team":  current,
+        "active_team":   active,
+        "surface_bonus": dict(sb) if sb else None,
         "turn_order":    game["turn_order"],
         "turn_state":    ts,
         "submarines":    subs,
         "winner":        game["winner"],
-        "map": {
-            "rows":        map_def["rows"],
-            "cols":        map_def["cols"],
-            "sector_size": map_def["sector_size"],
-            "islands":     map_def["islands"],
-            "name":        map_def["name"],
-        },
+        "map":           map_def["view"],
     }
+
+
+def diff_view(old, new):
+    """Return the parts of view `new` that differ from `old`, both produced by
+    serialize_game for the same perspective. Top-level keys are compared one by
+    one and changed submarines are included whole; {} means nothing changed."""
+    if old is new:
+        return {}
+    patch = {}
+    for key, value in new.items():
+        if key == "submarines":
+            old_subs = old["submarines"]
+            subs = {team: sub for team, sub in value.items() if old_subs.get(team) != sub}
+            if subs:
+                patch["submarines"] = subs
+        elif key not in old or (old[key] is not value and old[key] != value):
+            patch[key] = value
+    return patch
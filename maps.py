@@ -1,6 +1,8 @@
 # Captain Sonar – Map definitions
 # Coordinates are 0-indexed (row, col)
 
+import functools
+
 MAPS = {
     "alpha": {
         "name": "Map Alpha",
@@ -39,12 +41,95 @@ def get_sector(row, col, sector_size=5, map_cols=15):
     return sr * sectors_per_row + sc + 1
 
 
+def _sector_table(map_def):
+    """Precompute sector_table[row][col] -> sector number for a map."""
+    size, cols = map_def["sector_size"], map_def["cols"]
+    return tuple(
+        tuple(get_sector(r, c, size, cols) for c in range(cols))
+        for r in range(map_def["rows"])
+    )
+
+
+# (direction, row delta, col delta) for the four captain moves
+_MOVES = (("north", -1, 0), ("south", 1, 0), ("east", 0, 1), ("west", 0, -1))
+
+
+def _neighbors(map_def):
+    """Precompute neighbors[(row, col)] -> ((direction, row, col), ...) for every
+    water cell: the in-bounds, non-island cells one move away."""
+    rows, cols = map_def["rows"], map_def["cols"]
+    islands = map_def["island_set"]
+    return {
+        (r, c): tuple(
+            (direction, r + dr, c + dc) for direction, dr, dc in _MOVES
+            if 0 <= r + dr < rows and 0 <= c + dc < cols and (r + dr, c + dc) not in islands
+        )
+        for r in range(rows) for c in range(cols) if (r, c) not in islands
+    }
+
+
+def _max_run(map_def):
+    """Precompute max_run[direction][row][col] -> how many cells a sub at (row, col)
+    can travel in a straight line before leaving the map or hitting an island."""
+    rows, cols = map_def["rows"], map_def["cols"]
+    islands = map_def["island_set"]
+    table = {}
+    for direction, dr, dc in _MOVES:
+        grid = []
+        for r in range(rows):
+            row = []
+            for c in range(cols):
+                n, nr, nc = 0, r + dr, c + dc
+                while 0 <= nr < rows and 0 <= nc < cols and (nr, nc) not in islands:
+                    n, nr, nc = n + 1, nr + dr, nc + dc
+                row.append(n)
+            grid.append(tuple(row))
+        table[direction] = tuple(grid)
+    return table
+
+
+def _torpedo_reach(map_def, reach=4):
+    """Precompute torpedo_reach[(row, col)] -> frozenset of the water cells a
+    torpedo fired from (row, col) can hit: Manhattan distance 1..reach."""
+    rows, cols = map_def["rows"], map_def["cols"]
+    islands = map_def["island_set"]
+    water = [(r, c) for r in range(rows) for c in range(cols) if (r, c) not in islands]
+    return {
+        (r, c): frozenset(
+            (tr, tc) for tr, tc in water if 0 < abs(tr - r) + abs(tc - c) <= reach
+        )
+        for r, c in water
+    }
+
+
+for _map_def in MAPS.values():
+    _map_def["island_set"] = frozenset(map(tuple, _map_def["islands"]))
+    # open_water[row][col] is True for every non-island cell
+    _map_def["open_water"] = tuple(
+        tuple((r, c) not in _map_def["island_set"] for c in range(_map_def["cols"]))
+        for r in range(_map_def["rows"])
+    )
+    _map_def["sector_table"] = _sector_table(_map_def)
+    _map_def["neighbors"] = _neighbors(_map_def)
+    _map_def["torpedo_reach"] = _torpedo_reach(_map_def)
+    _map_def["max_run"] = _max_run(_map_def)
+    # Client-facing subset of the map, shared by every serialized game state
+    _map_def["view"] = {
+        "rows":        _map_def["rows"],
+        "cols":        _map_def["cols"],
+        "sector_size": _map_def["sector_size"],
+        "islands":     _map_def["islands"],
+        "name":        _map_def["name"],
+    }
+
+
+@functools.lru_cache(maxsize=8)
 def get_col_labels(n):
-    """Generate A, B, C … Z, AA, AB … column labels."""
+    """Generate A, B, C … Z, AA, AB … column labels (cached; returned as a tuple)."""
     labels = []
     for i in range(n):
         if i < 26:
             labels.append(chr(ord('A') + i))
         else:
             labels.append(chr(ord('A') + (i // 26) - 1) + chr(ord('A') + (i % 26)))
-    return labels
+    return tuple(labels)
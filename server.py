@@ -5,21 +5,52 @@ Run:  python server.py
 
 from __future__ import annotations
 import secrets, string
+from contextlib import contextmanager
+from functools import partial, wraps
 from flask import Flask, render_template, request, session, redirect, url_for, jsonify
 from flask_socketio import SocketIO, emit, join_room, leave_room
+from eventlet.green.threading import RLock
 import game_state as gs
 from maps import get_col_labels, MAPS
 from bots import CaptainBot, FirstMateBot, EngineerBot, RadioOperatorBot
 
+try:
+    import orjson   # optional: faster encoding of Socket.IO payloads
+except ImportError:
+    orjson = None
+
+
+class _OrjsonCodec:
+    """Drop-in for the stdlib json module (dumps returns str) backed by orjson."""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(32)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet",
+                    json=_OrjsonCodec if orjson else None)
 
 # ── In-memory storage ─────────────────────────────────────────────────────────
 # games[game_id] = {
 #   "game":    game_state dict (from game_state.py) or None pre-start,
-#   "players": { name: {name, team, role, ready, sid, is_bot, bot} },
+#   "players": { name: {name, team, role, ready, sid, is_bot} }  (JSON-safe),
+#   "bots":    { name: bot object (bots.py) } for the bot players,
+#   "by_team_role": { (team, role): player dict } for players holding a role,
+#   "name_index": { name.lower(): ("player" | "spectator", name) } for every name in use,
 #   "host":    name (first player to create),
+#   "spectators":  { name: {name, sid} },
+#   "sent_states": { perspective: last game state broadcast to that room },
+#   "sent_rev": game["rev"] at the last broadcast (None before the first),
+#   "batch":   emits queued inside a _batched block (see _emit), else absent/None,
+#   "state_dirty": True when a state broadcast is owed at the end of the batch,
+#   "lock":    green RLock held by the handler or bot step currently changing the game,
 # }
 games: dict = {}
 
@@ -32,6 +63,7 @@ bot_tasks: dict = {}
 VALID_TEAMS = {"blue", "red"}
 VALID_ROLES = {"captain", "first_mate", "engineer", "radio_operator"}
 BOT_NAME_PREFIX = "Bot"
+BOT_THINK_DELAY = 1.2   # seconds before each bot action, so bot play stays watchable
 
 
 # ── Spectator helpers ─────────────────────────────────────────────────────────
@@ -40,17 +72,6 @@ def _get_spectators(game_id):
     return games[game_id].get("spectators", {})
 
 
-def _broadcast_to_spectators(game_id):
-    """Send full (unmasked) game state to all connected spectators."""
-    g = games[game_id]
-    if not g.get("game"):
-        return
-    state = gs.serialize_game(g["game"], perspective_team=None)
-    for spec in _get_spectators(game_id).values():
-        if spec.get("sid"):
-            socketio.emit("game_state", state, room=spec["sid"])
-
-
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
 def _gen_id():
@@ -62,10 +83,7 @@ def _gen_id():
 
 def _lobby_state(game_id):
     g = games[game_id]
-    # Exclude non-JSON-serializable bot objects from player data
-    players = []
-    for p in g["players"].values():
-        players.append({k: v for k, v in p.items() if k != "bot"})
+    players = list(g["players"].values())
     spectators = [{"name": s["name"]} for s in g.get("spectators", {}).values()]
     return {
         "game_id":    game_id,
@@ -88,6 +106,19 @@ def _get_player(game_id, name):
     return games[game_id]["players"].get(name)
 
 
+def _seat_player(g, p):
+    """Index p under its (team, role) slot; call after setting team/role."""
+    if p["team"] and p["role"]:
+        g["by_team_role"][(p["team"], p["role"])] = p
+
+
+def _unseat_player(g, p):
+    """Drop p from the (team, role) index; call before changing team/role or removing p."""
+    key = (p["team"], p["role"])
+    if g["by_team_role"].get(key) is p:
+        del g["by_team_role"][key]
+
+
 def _emit_error(msg, sid=None):
     if sid:
         socketio.emit("error", {"msg": msg}, room=sid)
@@ -95,184 +126,308 @@ def _emit_error(msg, sid=None):
         emit("error", {"msg": msg})
 
 
-def _team_role_sids(game_id, team=None, role=None):
-    """Return list of sids matching optional team/role filters (human only)."""
-    sids = []
-    for p in games[game_id]["players"].values():
-        if p.get("is_bot"):
-            continue
-        if team and p["team"] != team:
-            continue
-        if role and p["role"] != role:
-            continue
-        if p.get("sid"):
-            sids.append(p["sid"])
-    return sids
+# ── Socket.IO rooms ───────────────────────────────────────────────────────────
+# Besides the game room (game_id), every connected human player's sid sits in a
+# room for their team, their role and their team+role, and spectators share a
+# spectators room, so targeted events are a single emit. Rooms follow the
+# player's current sid, team and role.
+
+def _team_room(game_id, team):
+    return f"{game_id}:team:{team}"
+
+
+def _spectator_room(game_id):
+    return f"{game_id}:spectators"
+
+
+def _role_room(game_id, role):
+    return f"{game_id}:role:{role}"
+
+
+def _team_role_room(game_id, team, role):
+    return f"{game_id}:{team}:{role}"
+
+
+def _player_rooms(game_id, p):
+    """Rooms (besides the game room) a human player's sid belongs to."""
+    rooms = []
+    if p["team"]:
+        rooms.append(_team_room(game_id, p["team"]))
+    if p["role"]:
+        rooms.append(_role_room(game_id, p["role"]))
+        if p["team"]:
+            rooms.append(_team_role_room(game_id, p["team"], p["role"]))
+    return rooms
+
+
+def _enter_player_rooms(game_id, p):
+    if p.get("sid"):
+        for room in _player_rooms(game_id, p):
+            join_room(room, sid=p["sid"])
+
+
+def _leave_player_rooms(game_id, p):
+    if p.get("sid"):
+        for room in _player_rooms(game_id, p):
+            leave_room(room, sid=p["sid"])
+
+
+def _emit(game_id, event, data, room):
+    """socketio.emit for one of a game's rooms. Inside a _batched block emits are
+    queued instead and consecutive ones to the same room leave as a single
+    "batch" frame ([[event, data], ...]); the order every client sees is unchanged.
+    A queued payload is only encoded at the flush, so it must not share containers
+    the game keeps mutating: pass copies (dict(sub["systems"]), list(sub["trail"]))."""
+    batch = games[game_id].get("batch")
+    if batch is None:
+        socketio.emit(event, data, room=room)
+    elif batch and batch[-1][0] == room:
+        batch[-1][1].append([event, data])
+    else:
+        batch.append((room, [[event, data]]))
+
+
+def _flush_batch(batch):
+    for room, items in batch:
+        if len(items) == 1:
+            socketio.emit(items[0][0], items[0][1], room=room)
+        else:
+            socketio.emit("batch", items, room=room)
 
 
 def _emit_to_role(game_id, role, event, data):
-    for sid in _team_role_sids(game_id, role=role):
-        socketio.emit(event, data, room=sid)
+    _emit(game_id, event, data, _role_room(game_id, role))
 
 
 def _emit_to_team_role(game_id, team, role, event, data):
-    for sid in _team_role_sids(game_id, team=team, role=role):
-        socketio.emit(event, data, room=sid)
+    _emit(game_id, event, data, _team_role_room(game_id, team, role))
+
+
+@contextmanager
+def _batched(game_id):
+    """Queue the game's emits (see _emit) and state broadcasts until the outermost
+    _batched block exits, then send the state once and flush the queue. Nested
+    blocks (e.g. a bot answering a sonar mid-dispatch) share the outer batch."""
+    g = games[game_id]
+    if g.get("batch") is not None:
+        yield
+        return
+    g["batch"] = []
+    try:
+        yield
+    finally:
+        if g.pop("state_dirty", False):
+            _send_game_state(game_id)
+        batch, g["batch"] = g["batch"], None
+        _flush_batch(batch)
+
+
+def _game_action(handler):
+    """Run a socket handler for data["game_id"] holding the game's lock, so lobby
+    changes, actions and bot steps never interleave, and inside _batched, so the
+    action sends one state update after all of its events."""
+    @wraps(handler)
+    def wrapper(data):
+        game_id = (data.get("game_id") or "").upper().strip()
+        if game_id not in games:
+            return handler(data)
+        with games[game_id]["lock"], _batched(game_id):
+            return handler(data)
+    return wrapper
 
 
 def _dispatch_events(game_id, game, events):
-    """Route events from game_state to the correct clients."""
-    for ev in events:
-        t = ev.get("type")
-
-        if t == "moved":
-            socketio.emit("direction_announced",
-                          {"team": ev["team"], "direction": ev["direction"]},
-                          room=game_id)
-            _emit_to_team_role(game_id, ev["team"], "captain", "moved_self",
-                                {"row": ev["row"], "col": ev["col"],
-                                 "trail": game["submarines"][ev["team"]]["trail"],
-                                 "direction": ev["direction"]})
-            _emit_to_team_role(game_id, ev["team"], "engineer", "direction_to_mark",
-                                {"direction": ev["direction"]})
-            _emit_to_team_role(game_id, ev["team"], "first_mate", "can_charge", {})
-            # Update radio operator bot for enemy team
-            _update_ro_bot(game_id, ev["team"], "direction", direction=ev["direction"])
-
-        elif t == "surfaced":
-            socketio.emit("surface_announced",
-                          {"team": ev["team"], "sector": ev["sector"],
-                           "health": ev["health"]},
-                          room=game_id)
-            # Update radio operator bot and captain bot
-            _update_ro_bot(game_id, ev["team"], "surface", sector=ev["sector"])
-            _update_captain_bot_enemy_surfaced(game_id, ev["team"], ev["sector"])
-
-        elif t == "torpedo_fired":
-            socketio.emit("torpedo_fired",
-                          {"team": ev["team"], "row": ev["row"], "col": ev["col"]},
-                          room=game_id)
-            _update_ro_bot(game_id, ev["team"], "torpedo", row=ev["row"], col=ev["col"])
-
-        elif t == "damage":
-            socketio.emit("damage",
-                          {"team": ev["team"], "amount": ev["amount"],
-                           "health": ev["health"], "cause": ev.get("cause", ""),
-                           "row": ev.get("row"), "col": ev.get("col")},
-                          room=game_id)
-
-        elif t == "engineering_damage":
-            socketio.emit("damage",
-                          {"team": ev["team"], "amount": ev["damage"],
-                           "health": ev["health"],
-                           "cause": ev["cause"]},
-                          room=game_id)
-            _emit_to_team_role(game_id, ev["team"], "engineer", "board_update",
-                                {"board": game["submarines"][ev["team"]]["engineering"]})
-
-        elif t == "circuit_cleared":
-            team_c = ev.get("team") or _current_active(game_id)
-            _emit_to_team_role(game_id, team_c, "engineer",
-                                "board_update",
-                                {"board": game["submarines"][team_c]["engineering"]})
-            socketio.emit("circuit_cleared",
-                          {"team": team_c, "circuit": ev.get("circuit")},
-                          room=game_id)
-
-        elif t == "system_charged":
-            _emit_to_team_role(game_id, ev["team"], "first_mate", "systems_update",
-                                {"systems": game["submarines"][ev["team"]]["systems"]})
-            _emit_to_team_role(game_id, ev["team"], "captain", "systems_update",
-                                {"systems": game["submarines"][ev["team"]]["systems"]})
-
-        elif t == "mine_placed":
-            _emit_to_team_role(game_id, ev["team"], "captain", "mine_placed_ack",
-                                {"mines": game["submarines"][ev["team"]]["mines"],
-                                 "systems": game["submarines"][ev["team"]]["systems"]})
-            _emit_to_team_role(game_id, ev["team"], "first_mate", "systems_update",
-                                {"systems": game["submarines"][ev["team"]]["systems"]})
-
-        elif t == "mine_detonated":
-            socketio.emit("mine_detonated",
-                          {"team": ev["team"], "row": ev["row"], "col": ev["col"]},
-                          room=game_id)
-
-        elif t == "sonar_announced":
-            socketio.emit("sonar_announced", {"team": ev["team"]}, room=game_id)
-
-        elif t == "sonar_activated":
-            # RULEBOOK interactive sonar: emit query to enemy captain, auto-respond if bot
-            activating_team = ev["team"]
-            enemy = gs.other_team(activating_team)
-            socketio.emit("sonar_announced", {"team": activating_team}, room=game_id)
-            # Send query to enemy captain (human or bot)
-            _emit_to_team_role(game_id, enemy, "captain", "sonar_query",
-                                {"activating_team": activating_team})
-            # If enemy captain is a bot, auto-respond immediately
-            enemy_cap = _get_bot_for_role(game_id, enemy, "captain")
-            if enemy_cap and enemy_cap.get("bot"):
-                _bot_sonar_respond(game_id, game, enemy, enemy_cap)
-
-        elif t == "sonar_result":
-            # Result goes to the activating team's captain + first_mate
-            target = ev["target"]
-            result_data = {"type1": ev["type1"], "val1": ev["val1"],
-                           "type2": ev["type2"], "val2": ev["val2"]}
-            _emit_to_team_role(game_id, target, "captain",    "sonar_result", result_data)
-            _emit_to_team_role(game_id, target, "first_mate", "sonar_result", result_data)
-            _emit_to_team_role(game_id, target, "first_mate", "systems_update",
-                                {"systems": game["submarines"][target]["systems"]})
-            # Update captain bot sonar knowledge
-            _update_captain_bot_sonar(game_id, target,
-                                       ev["type1"], ev["val1"], ev["type2"], ev["val2"])
-
-        elif t == "drone_used":
-            socketio.emit("drone_announced",
-                          {"team": ev["team"], "sector": ev["ask_sector"]},
-                          room=game_id)
-
-        elif t == "drone_result":
-            # Result goes to first_mate (drone is operated by first mate)
-            _emit_to_team_role(game_id, ev["target"], "first_mate", "drone_result",
-                                {"in_sector": ev["in_sector"],
-                                 "ask_sector": ev.get("ask_sector", 0)})
-            _emit_to_team_role(game_id, ev["target"], "first_mate", "systems_update",
-                                {"systems": game["submarines"][ev["target"]]["systems"]})
-            # Update captain bot drone knowledge (internal bot state only)
-            _update_captain_bot_drone(game_id, ev["target"],
-                                       ev.get("ask_sector", 0), ev["in_sector"])
-
-        elif t == "stealth_used":
-            socketio.emit("stealth_announced",
-                          {"team": ev["team"], "steps": ev["steps"]},
-                          room=game_id)
-            _emit_to_team_role(game_id, ev["team"], "captain", "moved_self",
-                                {"row": game["submarines"][ev["team"]]["position"][0],
-                                 "col": game["submarines"][ev["team"]]["position"][1],
-                                 "trail": game["submarines"][ev["team"]]["trail"]})
-            _emit_to_team_role(game_id, ev["team"], "first_mate", "systems_update",
-                                {"systems": game["submarines"][ev["team"]]["systems"]})
-            # RULEBOOK stealth: engineer still marks 1 node (in stealth direction, privately)
-            # and FM still charges 1 system — notify both via private events
-            _emit_to_team_role(game_id, ev["team"], "engineer", "direction_to_mark",
-                                {"direction": ev["direction"], "is_stealth": True})
-            _emit_to_team_role(game_id, ev["team"], "first_mate", "can_charge",
-                                {"is_stealth": True})
-
-        elif t == "turn_end":
-            pass
-
-        elif t == "turn_start":
-            socketio.emit("turn_start", {"team": ev["team"]}, room=game_id)
-            _broadcast_game_state(game_id)
-            # Radio operator bot for the new team generates commentary on enemy
-            _emit_ro_bot_commentary(game_id, ev["team"])
+    """Route events from game_state to the correct clients, batching the emits."""
+    with _batched(game_id):
+        _route_events(game_id, game, events)
+
 
-        elif t == "game_over":
-            games[game_id]["game"]["phase"] = "ended"
-            socketio.emit("game_over",
-                          {"winner": ev["winner"], "loser": ev["loser"]},
-                          room=game_id)
+def _route_events(game_id, game, events):
+    for ev in events:
+        handler = EVENT_HANDLERS.get(ev.get("type"))
+        if handler is not None:
+            handler(game_id, game, ev)
+
+
+def _handle_moved(game_id, game, ev):
+    _emit(game_id, "direction_announced",
+          {"team": ev["team"], "direction": ev["direction"]},
+          room=game_id)
+    _emit_to_team_role(game_id, ev["team"], "captain", "moved_self",
+                        {"row": ev["row"], "col": ev["col"],
+                         "trail": list(game["submarines"][ev["team"]]["trail"]),
+                         "direction": ev["direction"]})
+    _emit_to_team_role(game_id, ev["team"], "engineer", "direction_to_mark",
+                        {"direction": ev["direction"]})
+    _emit_to_team_role(game_id, ev["team"], "first_mate", "can_charge", {})
+    # Update radio operator bot for enemy team
+    _update_ro_bot(game_id, ev["team"], "direction", direction=ev["direction"])
+
+
+def _handle_surfaced(game_id, game, ev):
+    _emit(game_id, "surface_announced",
+          {"team": ev["team"], "sector": ev["sector"],
+           "health": ev["health"]},
+          room=game_id)
+    # Update radio operator bot and captain bot
+    _update_ro_bot(game_id, ev["team"], "surface", sector=ev["sector"])
+    _update_captain_bot_enemy_surfaced(game_id, ev["team"], ev["sector"])
+
+
+def _handle_torpedo_fired(game_id, game, ev):
+    _emit(game_id, "torpedo_fired",
+          {"team": ev["team"], "row": ev["row"], "col": ev["col"]},
+          room=game_id)
+    _update_ro_bot(game_id, ev["team"], "torpedo", row=ev["row"], col=ev["col"])
+
+
+def _handle_damage(game_id, game, ev):
+    _emit(game_id, "damage",
+          {"team": ev["team"], "amount": ev["amount"],
+           "health": ev["health"], "cause": ev.get("cause", ""),
+           "row": ev.get("row"), "col": ev.get("col")},
+          room=game_id)
+
+
+def _handle_engineering_damage(game_id, game, ev):
+    _emit(game_id, "damage",
+          {"team": ev["team"], "amount": ev["damage"],
+           "health": ev["health"],
+           "cause": ev["cause"]},
+          room=game_id)
+    _emit_to_team_role(game_id, ev["team"], "engineer", "board_update",
+                        {"board": gs.engineering_view(game["submarines"][ev["team"]])})
+
+
+def _handle_circuit_cleared(game_id, game, ev):
+    team_c = ev.get("team") or _current_active(game_id)
+    _emit_to_team_role(game_id, team_c, "engineer",
+                        "board_update",
+                        {"board": gs.engineering_view(game["submarines"][team_c])})
+    _emit(game_id, "circuit_cleared",
+          {"team": team_c, "circuit": ev.get("circuit")},
+          room=game_id)
+
+
+def _handle_system_charged(game_id, game, ev):
+    update = {"systems": dict(game["submarines"][ev["team"]]["systems"])}
+    _emit_to_team_role(game_id, ev["team"], "first_mate", "systems_update", update)
+    _emit_to_team_role(game_id, ev["team"], "captain",    "systems_update", update)
+
+
+def _handle_mine_placed(game_id, game, ev):
+    sub = game["submarines"][ev["team"]]
+    _emit_to_team_role(game_id, ev["team"], "captain", "mine_placed_ack",
+                        {"mines": list(sub["mines"]), "systems": dict(sub["systems"])})
+    _emit_to_team_role(game_id, ev["team"], "first_mate", "systems_update",
+                        {"systems": dict(sub["systems"])})
+
+
+def _handle_mine_detonated(game_id, game, ev):
+    _emit(game_id, "mine_detonated",
+          {"team": ev["team"], "row": ev["row"], "col": ev["col"]},
+          room=game_id)
+
+
+def _handle_sonar_activated(game_id, game, ev):
+    # RULEBOOK interactive sonar: emit query to enemy captain, auto-respond if bot
+    activating_team = ev["team"]
+    enemy = gs.OPPONENT[activating_team]
+    _emit(game_id, "sonar_announced", {"team": activating_team}, room=game_id)
+    # Send query to enemy captain (human or bot)
+    _emit_to_team_role(game_id, enemy, "captain", "sonar_query",
+                        {"activating_team": activating_team})
+    # If enemy captain is a bot, auto-respond immediately
+    enemy_cap = _get_bot_for_role(game_id, enemy, "captain")
+    if enemy_cap:
+        _bot_sonar_respond(game_id, game, enemy, enemy_cap)
+
+
+def _handle_sonar_result(game_id, game, ev):
+    # Result goes to the activating team's captain + first_mate
+    target = ev["target"]
+    result_data = {"type1": ev["type1"], "val1": ev["val1"],
+                   "type2": ev["type2"], "val2": ev["val2"]}
+    _emit_to_team_role(game_id, target, "captain",    "sonar_result", result_data)
+    _emit_to_team_role(game_id, target, "first_mate", "sonar_result", result_data)
+    _emit_to_team_role(game_id, target, "first_mate", "systems_update",
+                        {"systems": dict(game["submarines"][target]["systems"])})
+    # Update captain bot sonar knowledge
+    _update_captain_bot_sonar(game_id, target,
+                               ev["type1"], ev["val1"], ev["type2"], ev["val2"])
+
+
+def _handle_drone_used(game_id, game, ev):
+    _emit(game_id, "drone_announced",
+          {"team": ev["team"], "sector": ev["ask_sector"]},
+          room=game_id)
+
+
+def _handle_drone_result(game_id, game, ev):
+    # Result goes to first_mate (drone is operated by first mate), with the
+    # drained systems riding along
+    _emit_to_team_role(game_id, ev["target"], "first_mate", "drone_result",
+                        {"in_sector": ev["in_sector"],
+                         "ask_sector": ev.get("ask_sector", 0),
+                         "systems": dict(game["submarines"][ev["target"]]["systems"])})
+    # Update captain bot drone knowledge (internal bot state only)
+    _update_captain_bot_drone(game_id, ev["target"],
+                               ev.get("ask_sector", 0), ev["in_sector"])
+
+
+def _handle_stealth_used(game_id, game, ev):
+    sub = game["submarines"][ev["team"]]
+    row, col = sub["position"]
+    _emit(game_id, "stealth_announced",
+          {"team": ev["team"], "steps": ev["steps"]},
+          room=game_id)
+    _emit_to_team_role(game_id, ev["team"], "captain", "moved_self",
+                        {"row": row, "col": col, "trail": list(sub["trail"])})
+    _emit_to_team_role(game_id, ev["team"], "first_mate", "systems_update",
+                        {"systems": dict(sub["systems"])})
+    # RULEBOOK stealth: engineer still marks 1 node (in stealth direction, privately)
+    # and FM still charges 1 system — notify both via private events
+    _emit_to_team_role(game_id, ev["team"], "engineer", "direction_to_mark",
+                        {"direction": ev["direction"], "is_stealth": True})
+    _emit_to_team_role(game_id, ev["team"], "first_mate", "can_charge",
+                        {"is_stealth": True})
+
+
+def _handle_turn_start(game_id, game, ev):
+    _emit(game_id, "turn_start", {"team": ev["team"]}, room=game_id)
+    _broadcast_game_state(game_id)
+    # Radio operator bot for the new team generates commentary on enemy
+    _emit_ro_bot_commentary(game_id, ev["team"])
+
+
+def _handle_game_over(game_id, game, ev):
+    games[game_id]["game"]["phase"] = "ended"
+    _emit(game_id, "game_over",
+          {"winner": ev["winner"], "loser": ev["loser"]},
+          room=game_id)
+
+
+# game_state event type -> handler(game_id, game, ev). Types not listed need no
+# routing: gs.EV_TURN_END, and gs.EV_SONAR_ANNOUNCED (sent by
+# _handle_sonar_activated)
+EVENT_HANDLERS = {
+    gs.EV_MOVED:              _handle_moved,
+    gs.EV_SURFACED:           _handle_surfaced,
+    gs.EV_TORPEDO_FIRED:      _handle_torpedo_fired,
+    gs.EV_DAMAGE:             _handle_damage,
+    gs.EV_ENGINEERING_DAMAGE: _handle_engineering_damage,
+    gs.EV_CIRCUIT_CLEARED:    _handle_circuit_cleared,
+    gs.EV_SYSTEM_CHARGED:     _handle_system_charged,
+    gs.EV_MINE_PLACED:        _handle_mine_placed,
+    gs.EV_MINE_DETONATED:     _handle_mine_detonated,
+    gs.EV_SONAR_ACTIVATED:    _handle_sonar_activated,
+    gs.EV_SONAR_RESULT:       _handle_sonar_result,
+    gs.EV_DRONE_USED:         _handle_drone_used,
+    gs.EV_DRONE_RESULT:       _handle_drone_result,
+    gs.EV_STEALTH_USED:       _handle_stealth_used,
+    gs.EV_TURN_START:         _handle_turn_start,
+    gs.EV_GAME_OVER:          _handle_game_over,
+}
 
 
 def _current_active(game_id):
@@ -283,46 +438,74 @@ def _current_active(game_id):
 
 
 def _broadcast_game_state(game_id):
-    """Send personalised game state to each connected player, and full state to spectators."""
+    """Send the game state now, or once at the end of the open batch (see _batched)."""
     g = games[game_id]
-    if not g["game"]:
+    if g.get("batch") is not None:
+        g["state_dirty"] = True
         return
-    for name, p in g["players"].items():
-        if p.get("is_bot") or not p.get("sid"):
-            continue
-        team = p.get("team")
-        state = gs.serialize_game(g["game"], perspective_team=team)
-        socketio.emit("game_state", state, room=p["sid"])
-    # Spectators get full unmasked state
-    _broadcast_to_spectators(game_id)
+    _send_game_state(game_id)
+
+
+def _send_game_state(game_id):
+    """Send each team its masked game state, and spectators the full state.
+    After the first full state a room only gets "game_state_patch" messages holding
+    what changed since the previous broadcast (see gs.diff_view)."""
+    g = games[game_id]
+    game = g["game"]
+    if not game:
+        return
+    if g["sent_rev"] == game["rev"]:
+        return   # nothing changed since the last broadcast; every patch would be empty
+    g["sent_rev"] = game["rev"]
+    sent = g["sent_states"]
+    rooms = [(team, _team_room(game_id, team)) for team in gs.TEAMS]
+    rooms.append((None, _spectator_room(game_id)))
+    for perspective, room in rooms:
+        state = gs.serialize_game(game, perspective_team=perspective)
+        old = sent.get(perspective)
+        if old is None:
+            _emit(game_id, "game_state", state, room=room)
+        else:
+            patch = gs.diff_view(old, state)
+            if patch:
+                _emit(game_id, "game_state_patch", patch, room=room)
+        sent[perspective] = state
+
+
+def _join_state(g, perspective):
+    """Full state for a client joining `perspective`'s room: the last one broadcast
+    there, since later patches build on it (or the current state before any)."""
+    state = g["sent_states"].get(perspective)
+    if state is None:
+        state = gs.serialize_game(g["game"], perspective_team=perspective)
+    return state
 
 
 def _can_start(game_id):
     """Check if lobby is ready to start."""
     g = games[game_id]
-    players = list(g["players"].values())
+    players = g["players"]
     # Need at least 2 total (can be bots)
     if len(players) < 2:
         return False, "Need at least 2 players (humans or bots)"
-    teams_present = {p["team"] for p in players if p["team"]}
+    teams_present = {p["team"] for p in players.values() if p["team"]}
     if len(teams_present) < 2:
         return False, "Need players on both teams"
+    seats = g["by_team_role"]
     for team in teams_present:
-        team_players = [p for p in players if p["team"] == team]
-        roles = {p["role"] for p in team_players}
-        if "captain" not in roles:
+        if (team, "captain") not in seats:
             return False, f"{team} team needs a captain"
-        if "first_mate" not in roles:
+        if (team, "first_mate") not in seats:
             return False, f"{team} team needs a first mate"
-        if "engineer" not in roles:
+        if (team, "engineer") not in seats:
             return False, f"{team} team needs an engineer"
     return True, None
 
 
 # ── Bot helpers ────────────────────────────────────────────────────────────────
 
-def _make_bot_player(team: str, role: str) -> dict:
-    """Create a bot player entry."""
+def _make_bot_player(team: str, role: str):
+    """Create a bot player entry and its bot; the bot is stored in g["bots"]."""
     role_short = role.replace("_", "-")
     name = f"{BOT_NAME_PREFIX}_{team.capitalize()}_{role_short.capitalize()}"
     bot = None
@@ -342,24 +525,26 @@ def _make_bot_player(team: str, role: str) -> dict:
         "ready":   True,
         "sid":     None,
         "is_bot":  True,
-        "bot":     bot,
-    }
+    }, bot
+
+
+def _bot(game_id: str, p: dict):
+    """The bot object behind bot player p."""
+    return games[game_id]["bots"][p["name"]]
 
 
 def _get_bot_for_role(game_id: str, team: str, role: str):
     """Return the bot player dict if a bot holds this team/role, else None."""
-    for p in games[game_id]["players"].values():
-        if p.get("is_bot") and p["team"] == team and p["role"] == role:
-            return p
-    return None
+    p = games[game_id]["by_team_role"].get((team, role))
+    return p if p is not None and p.get("is_bot") else None
 
 
 def _update_ro_bot(game_id: str, moving_team: str, event_type: str, **kwargs):
     """Notify radio-operator bots on the OTHER team about an enemy event."""
-    enemy_team = "red" if moving_team == "blue" else "blue"
+    enemy_team = gs.OPPONENT[moving_team]
     ro = _get_bot_for_role(game_id, enemy_team, "radio_operator")
-    if ro and ro.get("bot"):
-        b = ro["bot"]
+    if ro:
+        b = _bot(game_id, ro)
         if event_type == "direction":
             b.record_direction(kwargs["direction"])
         elif event_type == "surface":
@@ -373,32 +558,32 @@ def _update_ro_bot(game_id: str, moving_team: str, event_type: str, **kwargs):
 def _update_captain_bot_sonar(game_id, team, type1, val1, type2, val2):
     """Update the captain bot's sonar knowledge (new interactive format)."""
     cap = _get_bot_for_role(game_id, team, "captain")
-    if cap and cap.get("bot"):
-        cap["bot"].update_sonar_result(type1, val1, type2, val2)
+    if cap:
+        _bot(game_id, cap).update_sonar_result(type1, val1, type2, val2)
 
 
 def _update_captain_bot_drone(game_id, team, sector, in_sector):
     """Update the captain bot's drone knowledge."""
     cap = _get_bot_for_role(game_id, team, "captain")
-    if cap and cap.get("bot"):
-        cap["bot"].update_drone_result(sector, in_sector)
+    if cap:
+        _bot(game_id, cap).update_drone_result(sector, in_sector)
 
 
 def _update_captain_bot_enemy_surfaced(game_id, surfaced_team, sector):
     """Update enemy captain bot's knowledge when a team surfaces."""
     # The OTHER team's captain knows about the surfaced team's sector
-    enemy_team = "red" if surfaced_team == "blue" else "blue"
+    enemy_team = gs.OPPONENT[surfaced_team]
     cap = _get_bot_for_role(game_id, enemy_team, "captain")
-    if cap and cap.get("bot"):
-        cap["bot"].update_enemy_surfaced(sector)
+    if cap:
+        _bot(game_id, cap).update_enemy_surfaced(sector)
 
 
 def _emit_ro_bot_commentary(game_id: str, current_team: str):
     """Emit radio-operator bot commentary for the team whose turn just started."""
     ro = _get_bot_for_role(game_id, current_team, "radio_operator")
-    if ro and ro.get("bot"):
-        msg = ro["bot"].generate_commentary()
-        socketio.emit("bot_chat", {
+    if ro:
+        msg = _bot(game_id, ro).generate_commentary()
+        _emit(game_id, "bot_chat", {
             "team":  current_team,
             "role":  "radio_operator",
             "name":  ro["name"],
@@ -418,35 +603,47 @@ def _schedule_bots(game_id: str):
 
 def _run_bot_loop(game_id: str):
     """
-    Background task: execute pending bot actions with 1.2 s pauses.
-    Stops when no bot action is needed (human turn, game over, etc.).
+    Background task: execute pending bot actions, each after a BOT_THINK_DELAY pause.
+    Exits as soon as no bot action is needed (human turn, game over, etc.); human
+    actions call _schedule_bots again.
     """
-    import eventlet
-    max_steps = 300   # safety ceiling
-    steps = 0
     try:
-        while steps < max_steps:
-            steps += 1
-            eventlet.sleep(1.2)
-
-            if game_id not in games:
-                break
-            g = games[game_id]
-            game = g["game"]
-            if not game or game["phase"] not in ("placement", "playing"):
-                break
-
-            if game["phase"] == "placement":
-                acted = _bot_placement_step(game_id, g, game)
-            else:
-                acted = _bot_playing_step(game_id, g, game)
-
+        while _next_bot_step(game_id) is not None:
+            socketio.sleep(BOT_THINK_DELAY)
+            g = games.get(game_id)
+            if g is None:
+                break   # game removed during the pause
+            with g["lock"]:
+                # Re-check: a human may have acted (or left) during the pause
+                step = _next_bot_step(game_id)
+                if step is None:
+                    break
+                with _batched(game_id):
+                    acted = step()
             if not acted:
                 break
     finally:
         bot_tasks[game_id] = False
 
 
+def _next_bot_step(game_id: str):
+    """The next pending bot action as a zero-argument callable returning whether it
+    acted, or None when no bot has anything to do."""
+    g = games.get(game_id)
+    game = g["game"] if g else None
+    if not game:
+        return None
+    if game["phase"] == "placement":
+        for team in ["blue", "red"]:
+            if (game["submarines"][team]["position"] is None
+                    and _get_bot_for_role(game_id, team, "captain") is not None):
+                return partial(_bot_placement_step, game_id, g, game)
+        return None
+    if game["phase"] == "playing":
+        return _next_bot_playing_step(game_id, g, game)
+    return None
+
+
 def _bot_placement_step(game_id: str, g: dict, game: dict) -> bool:
     """Place submarines for any bot captains that haven't placed yet."""
     acted = False
@@ -456,28 +653,25 @@ def _bot_placement_step(game_id: str, g: dict, game: dict) -> bool:
         cap = _get_bot_for_role(game_id, team, "captain")
         if cap is None:
             continue
-        bot: CaptainBot = cap["bot"]
+        bot: CaptainBot = _bot(game_id, cap)
         row, col = bot.decide_placement(game["map"])
         ok, msg = gs.place_submarine(game, team, row, col)
         if ok:
-            socketio.emit("sub_placed", {"team": team}, room=game_id)
-            socketio.emit("bot_chat", {
+            _emit(game_id, "sub_placed", {"team": team}, room=game_id)
+            _emit(game_id, "bot_chat", {
                 "team": team, "role": "captain", "name": cap["name"],
                 "msg": f"Placing submarine at row {row+1}, col {col+1} 🗺",
             }, room=game_id)
             if game["phase"] == "playing":
                 current = gs.current_team(game)
-                socketio.emit("game_phase", {"current_team": current}, room=game_id)
+                _emit(game_id, "game_phase", {"current_team": current}, room=game_id)
                 _broadcast_game_state(game_id)
             acted = True
     return acted
 
 
-def _bot_playing_step(game_id: str, g: dict, game: dict) -> bool:
-    """Execute one pending bot action for the current team. Returns True if acted."""
-    if game["phase"] == "ended":
-        return False
-
+def _next_bot_playing_step(game_id: str, g: dict, game: dict):
+    """Pick the pending bot action for the current team (see _next_bot_step)."""
     team = gs.current_team(game)
     ts   = game["turn_state"]
     sub  = game["submarines"][team]
@@ -486,59 +680,64 @@ def _bot_playing_step(game_id: str, g: dict, game: dict) -> bool:
     if sub["surfaced"] and not ts["moved"]:
         cap = _get_bot_for_role(game_id, team, "captain")
         if cap is not None:
-            ok, msg = gs.captain_dive(game, team)
-            if ok:
-                socketio.emit("dive_announced", {"team": team}, room=game_id)
-                socketio.emit("bot_chat", {
-                    "team": team, "role": "captain", "name": cap["name"],
-                    "msg": "Diving back down 🤿",
-                }, room=game_id)
-                _broadcast_game_state(game_id)
-                return True
+            return partial(_bot_dive, game_id, game, team, cap)
 
     # Step 0b — If waiting for sonar response and enemy captain is a bot, auto-respond
     if ts.get("waiting_for") == "sonar_response":
-        responding_team = gs.other_team(team)
+        responding_team = gs.OPPONENT[team]
         enemy_cap = _get_bot_for_role(game_id, responding_team, "captain")
-        if enemy_cap and enemy_cap.get("bot"):
-            return _bot_sonar_respond(game_id, game, responding_team, enemy_cap)
-        return False   # waiting for human enemy captain
+        if enemy_cap:
+            return partial(_bot_sonar_respond, game_id, game, responding_team, enemy_cap)
+        return None   # waiting for human enemy captain
 
     # Step 1 — Captain must move (or surface/weapon) if not yet moved
     if not ts["moved"]:
         cap = _get_bot_for_role(game_id, team, "captain")
         if cap is None:
-            return False   # human captain — wait
-        return _bot_captain_action(game_id, g, game, team, cap)
+            return None   # human captain — wait
+        return partial(_bot_captain_action, game_id, g, game, team, cap)
 
     # Step 2 — Engineer marks (on normal move OR stealth move)
     has_dir = ts["direction"] is not None or ts.get("stealth_direction") is not None
     if not ts["engineer_done"] and has_dir:
         eng = _get_bot_for_role(game_id, team, "engineer")
         if eng is not None:
-            return _bot_engineer_action(game_id, g, game, team, eng)
+            return partial(_bot_engineer_action, game_id, g, game, team, eng)
 
     # Step 3 — First mate charges (on normal move OR stealth move)
     if not ts["first_mate_done"] and has_dir:
         fm = _get_bot_for_role(game_id, team, "first_mate")
         if fm is not None:
-            return _bot_fm_action(game_id, g, game, team, fm)
+            return partial(_bot_fm_action, game_id, g, game, team, fm)
 
     # Step 4 — End turn if possible and captain is a bot
     ok, _ = gs.can_end_turn(game, team)
     if ok:
         cap = _get_bot_for_role(game_id, team, "captain")
         if cap is not None:
-            return _bot_end_turn(game_id, g, game, team, cap)
+            return partial(_bot_end_turn, game_id, g, game, team, cap)
 
-    return False
+    return None
+
+
+def _bot_dive(game_id, game, team, cap_player) -> bool:
+    """Captain bot dives after surfacing."""
+    ok, msg = gs.captain_dive(game, team)
+    if ok:
+        _emit(game_id, "dive_announced", {"team": team}, room=game_id)
+        _emit(game_id, "bot_chat", {
+            "team": team, "role": "captain", "name": cap_player["name"],
+            "msg": "Diving back down 🤿",
+        }, room=game_id)
+        _broadcast_game_state(game_id)
+    return ok
 
 
 def _bot_captain_action(game_id, g, game, team, cap_player) -> bool:
     """Captain bot takes its action. Returns True if an action was taken."""
-    bot: CaptainBot = cap_player["bot"]
+    bot: CaptainBot = _bot(game_id, cap_player)
     sub = game["submarines"][team]
-    enemy_team = "red" if team == "blue" else "blue"
+    enemy_team = gs.OPPONENT[team]
     enemy_health = game["submarines"][enemy_team]["health"]
     name = cap_player["name"]
 
@@ -554,7 +753,7 @@ def _bot_captain_action(game_id, g, game, team, cap_player) -> bool:
         if ok:
             _dispatch_events(game_id, game, events)
             _broadcast_game_state(game_id)
-            socketio.emit("bot_chat", {
+            _emit(game_id, "bot_chat", {
                 "team": team, "role": "captain", "name": name,
                 "msg": f"Moving {direction} ↗",
             }, room=game_id)
@@ -577,11 +776,11 @@ def _bot_captain_action(game_id, g, game, team, cap_player) -> bool:
         if ok:
             _dispatch_events(game_id, game, events)
             _emit_to_team_role(game_id, team, "captain", "systems_update",
-                               {"systems": game["submarines"][team]["systems"]})
+                               {"systems": dict(game["submarines"][team]["systems"])})
             _emit_to_team_role(game_id, team, "first_mate", "systems_update",
-                               {"systems": game["submarines"][team]["systems"]})
+                               {"systems": dict(game["submarines"][team]["systems"])})
             _broadcast_game_state(game_id)
-            socketio.emit("bot_chat", {
+            _emit(game_id, "bot_chat", {
                 "team": team, "role": "captain", "name": name,
                 "msg": f"🚀 Firing torpedo at ({tr+1},{tc+1})!",
             }, room=game_id)
@@ -593,9 +792,9 @@ def _bot_captain_action(game_id, g, game, team, cap_player) -> bool:
         if ok:
             _dispatch_events(game_id, game, events)
             in_sec = any(ev.get("in_sector") for ev in events
-                         if ev.get("type") == "drone_result")
+                         if ev.get("type") == gs.EV_DRONE_RESULT)
             _broadcast_game_state(game_id)
-            socketio.emit("bot_chat", {
+            _emit(game_id, "bot_chat", {
                 "team": team, "role": "captain", "name": name,
                 "msg": f"🛸 Drone sector {sector}: {'CONTACT!' if in_sec else 'clear'}",
             }, room=game_id)
@@ -606,7 +805,7 @@ def _bot_captain_action(game_id, g, game, team, cap_player) -> bool:
         if ok:
             _dispatch_events(game_id, game, events)
             _broadcast_game_state(game_id)
-            socketio.emit("bot_chat", {
+            _emit(game_id, "bot_chat", {
                 "team": team, "role": "captain", "name": name,
                 "msg": "📡 Sonar activated — awaiting enemy response",
             }, room=game_id)
@@ -621,7 +820,7 @@ def _bot_captain_action(game_id, g, game, team, cap_player) -> bool:
             if ok:
                 _dispatch_events(game_id, game, events)
                 _broadcast_game_state(game_id)
-                socketio.emit("bot_chat", {
+                _emit(game_id, "bot_chat", {
                     "team": team, "role": "captain", "name": name,
                     "msg": f"👻 Stealth: {steps} steps {direction}",
                 }, room=game_id)
@@ -640,7 +839,7 @@ def _do_surface(game_id, game, team, bot_name, surface_events):
     RULEBOOK: enemy gets 3 bonus turns after surfacing — bot must wait."""
     _dispatch_events(game_id, game, surface_events)
     _broadcast_game_state(game_id)
-    socketio.emit("bot_chat", {
+    _emit(game_id, "bot_chat", {
         "team": team, "role": "captain", "name": bot_name,
         "msg": "Surfacing to clear trail 🌊",
     }, room=game_id)
@@ -652,33 +851,30 @@ _do_surface_and_dive = _do_surface
 
 def _bot_engineer_action(game_id, g, game, team, eng_player) -> bool:
     """Engineer bot marks a node."""
-    bot: EngineerBot = eng_player["bot"]
+    bot: EngineerBot = _bot(game_id, eng_player)
     ts = game["turn_state"]
     # Use public direction or private stealth direction
     direction = ts["direction"] if ts["direction"] is not None else ts.get("stealth_direction")
-    board = game["submarines"][team]["engineering"]
+    sub = game["submarines"][team]
 
-    index = bot.decide_mark(board, direction)
-    if index is None:
-        # No valid node — skip (server will allow end turn without engineer done? check)
-        # Actually game_state requires engineer_done, so mark first available
-        available = list(range(6))
-        for i in available:
-            if not board[direction][i]["marked"]:
-                index = i
-                break
+    index = bot.decide_mark(gs.engineering_view(sub), direction)
     if index is None:
-        return False  # All marked — shouldn't happen but be safe
+        # game_state requires engineer_done, so mark the lowest unmarked node:
+        # the direction's free nodes as a 6-bit mask, then its lowest set bit
+        free = ~(sub["eng_marked"] >> gs.DIR_OFFSET[direction]) & ((1 << gs.NODES_PER_DIRECTION) - 1)
+        if not free:
+            return False  # All marked — shouldn't happen but be safe
+        index = (free & -free).bit_length() - 1
 
     ok, msg, events, _ = gs.engineer_mark(game, team, direction, index)
     if ok:
         # Send board update to human engineer (if any)
         _emit_to_team_role(game_id, team, "engineer", "board_update",
-                           {"board": board})
+                           {"board": gs.engineering_view(sub)})
         _dispatch_events(game_id, game, events)
         _broadcast_game_state(game_id)
         desc = bot.describe_mark(direction, index)
-        socketio.emit("bot_chat", {
+        _emit(game_id, "bot_chat", {
             "team": team, "role": "engineer", "name": eng_player["name"],
             "msg": f"🔧 {desc}",
         }, room=game_id)
@@ -688,28 +884,30 @@ def _bot_engineer_action(game_id, g, game, team, eng_player) -> bool:
 
 def _bot_fm_action(game_id, g, game, team, fm_player) -> bool:
     """First-mate bot charges a system."""
-    bot: FirstMateBot = fm_player["bot"]
+    bot: FirstMateBot = _bot(game_id, fm_player)
     systems = game["submarines"][team]["systems"]
 
     system = bot.decide_charge(systems)
     if system is None:
         # Everything full — FM done, allow end turn
         game["turn_state"]["first_mate_done"] = True
+        gs.mark_changed(game)
         return True
 
     ok, msg, events = gs.first_mate_charge(game, team, system)
     if ok:
         _dispatch_events(game_id, game, events)
         _emit_to_team_role(game_id, team, "first_mate", "systems_update",
-                           {"systems": game["submarines"][team]["systems"]})
+                           {"systems": dict(game["submarines"][team]["systems"])})
         _broadcast_game_state(game_id)
-        socketio.emit("bot_chat", {
+        _emit(game_id, "bot_chat", {
             "team": team, "role": "first_mate", "name": fm_player["name"],
             "msg": f"⚙️ {bot.describe_charge(system)}",
         }, room=game_id)
         return True
     # Charge failed (already full?); mark done
     game["turn_state"]["first_mate_done"] = True
+    gs.mark_changed(game)
     return True
 
 
@@ -724,14 +922,15 @@ def _bot_end_turn(game_id, g, game, team, cap_player) -> bool:
 
 def _bot_sonar_respond(game_id, game, responding_team, cap_player) -> bool:
     """Bot captain responds to a sonar query with 1 true and 1 false piece of info."""
-    bot = cap_player["bot"]
+    bot = _bot(game_id, cap_player)
     own_sub = game["submarines"][responding_team]
     type1, val1, type2, val2 = bot.respond_sonar(own_sub, game["map"])
     ok, msg, events = gs.captain_respond_sonar(game, responding_team, type1, val1, type2, val2)
     if ok:
         _dispatch_events(game_id, game, events)
         _broadcast_game_state(game_id)
-        socketio.emit("bot_chat", {
+        # _emit: when called from the sonar_activated dispatch this joins its batch
+        _emit(game_id, "bot_chat", {
             "team": responding_team, "role": "captain", "name": cap_player["name"],
             "msg": f"📡 Sonar response: {type1}={val1}, {type2}={val2}",
         }, room=game_id)
@@ -835,14 +1034,18 @@ def on_disconnect(*args):
         game_id  = info["game_id"]
         name     = info["name"]
         is_spec  = info.get("is_spectator", False)
-        if is_spec:
-            if game_id in games and name in _get_spectators(game_id):
-                games[game_id]["spectators"][name]["sid"] = None
-                _emit_lobby(game_id)
-        else:
-            if game_id in games and name in games[game_id]["players"]:
-                games[game_id]["players"][name]["sid"] = None
-                _emit_lobby(game_id)
+        g = games.get(game_id)
+        if g is None:
+            return
+        with g["lock"]:
+            if is_spec:
+                if name in _get_spectators(game_id):
+                    g["spectators"][name]["sid"] = None
+                    _emit_lobby(game_id)
+            else:
+                if name in g["players"]:
+                    g["players"][name]["sid"] = None
+                    _emit_lobby(game_id)
 
 
 @socketio.on("join_room")
@@ -864,17 +1067,25 @@ def on_create_game(data):
         "game":       None,
         "players":    {name: {"name": name, "team": "blue", "role": "",
                                "ready": False, "sid": request.sid,
-                               "is_bot": False, "bot": None}},
+                               "is_bot": False}},
         "spectators": {},
         "host":       name,
+        "bots":       {},
+        "by_team_role": {},
+        "name_index": {name.lower(): ("player", name)},
+        "lock":       RLock(),
+        "sent_states": {},   # perspective -> last state broadcast to that room
+        "sent_rev":   None,
     }
     sid_map[request.sid] = {"game_id": game_id, "name": name}
     join_room(game_id)
+    _enter_player_rooms(game_id, games[game_id]["players"][name])
     emit("game_created", {"game_id": game_id, "name": name})
     _emit_lobby(game_id)
 
 
 @socketio.on("join_game")
+@_game_action
 def on_join_game(data):
     game_id = (data.get("game_id") or "").upper().strip()
     name    = (data.get("name") or "").strip()
@@ -890,10 +1101,10 @@ def on_join_game(data):
         g["spectators"][name]["sid"] = request.sid
         sid_map[request.sid] = {"game_id": game_id, "name": name, "is_spectator": True}
         join_room(game_id)
+        join_room(_spectator_room(game_id))
         emit("spectator_ack", {"game_id": game_id, "name": name})
         if g["game"] is not None:
-            state = gs.serialize_game(g["game"], perspective_team=None)
-            emit("game_state", state)
+            emit("game_state", _join_state(g, None))
         else:
             _emit_lobby(game_id)
         return
@@ -903,10 +1114,10 @@ def on_join_game(data):
         g["players"][name]["sid"] = request.sid
         sid_map[request.sid] = {"game_id": game_id, "name": name}
         join_room(game_id)
+        _enter_player_rooms(game_id, g["players"][name])
         emit("join_ack", {"game_id": game_id, "name": name})
         if g["game"] is not None:
-            state = gs.serialize_game(g["game"], perspective_team=g["players"][name]["team"])
-            emit("game_state", state)
+            emit("game_state", _join_state(g, g["players"][name]["team"]))
         else:
             _emit_lobby(game_id)
         return
@@ -918,19 +1129,22 @@ def on_join_game(data):
     if human_count >= 8:
         return emit("error", {"msg": "Lobby is full (max 8 human players)"})
 
-    if any(p["name"].lower() == name.lower() for p in g["players"].values()):
+    if name.lower() in g["name_index"]:
         return emit("error", {"msg": "Name already taken"})
 
     g["players"][name] = {"name": name, "team": "red", "role": "",
                           "ready": False, "sid": request.sid,
-                          "is_bot": False, "bot": None}
+                          "is_bot": False}
+    g["name_index"][name.lower()] = ("player", name)
     sid_map[request.sid] = {"game_id": game_id, "name": name}
     join_room(game_id)
+    _enter_player_rooms(game_id, g["players"][name])
     emit("join_ack", {"game_id": game_id, "name": name})
     _emit_lobby(game_id)
 
 
 @socketio.on("join_as_spectator")
+@_game_action
 def on_join_as_spectator(data):
     """Join a game as a spectator (no role, full game visibility)."""
     game_id = (data.get("game_id") or "").upper().strip()
@@ -945,33 +1159,35 @@ def on_join_as_spectator(data):
 
     # If they're currently a player, remove them from players first
     if name in g["players"] and not g["players"][name].get("is_bot"):
+        _leave_player_rooms(game_id, g["players"][name])
+        _unseat_player(g, g["players"][name])
         del g["players"][name]
+        del g["name_index"][name.lower()]
 
     # Init spectators dict if missing (older games)
     if "spectators" not in g:
         g["spectators"] = {}
 
-    # Duplicate name check (against other spectators and players)
-    all_names = (
-        set(g["players"].keys()) |
-        {s for s in g["spectators"] if s != name}
-    )
-    if any(n.lower() == name.lower() for n in all_names):
+    # Duplicate name check (against players and other spectators)
+    taken = g["name_index"].get(name.lower())
+    if taken is not None and taken != ("spectator", name):
         return emit("error", {"msg": "Name already taken by a player"})
 
     g["spectators"][name] = {"name": name, "sid": request.sid}
+    g["name_index"][name.lower()] = ("spectator", name)
     sid_map[request.sid] = {"game_id": game_id, "name": name, "is_spectator": True}
     join_room(game_id)
+    join_room(_spectator_room(game_id))
     emit("spectator_ack", {"game_id": game_id, "name": name})
 
     if g["game"] is not None:
-        state = gs.serialize_game(g["game"], perspective_team=None)
-        emit("game_state", state)
+        emit("game_state", _join_state(g, None))
 
     _emit_lobby(game_id)
 
 
 @socketio.on("set_team")
+@_game_action
 def on_set_team(data):
     game_id = (data.get("game_id") or "").upper()
     name    = data.get("name", "")
@@ -980,12 +1196,23 @@ def on_set_team(data):
         return emit("error", {"msg": "Invalid team"})
     if not _player_in_game(game_id, name):
         return emit("error", {"msg": "Player not found"})
-    games[game_id]["players"][name]["team"] = team
-    games[game_id]["players"][name]["ready"] = False
+    g = games[game_id]
+    p = g["players"][name]
+    if p["role"]:
+        holder = g["by_team_role"].get((team, p["role"]))
+        if holder is not None and holder is not p:
+            return emit("error", {"msg": f"{p['role']} already taken on {team} team"})
+    _leave_player_rooms(game_id, p)
+    _unseat_player(g, p)
+    p["team"] = team
+    p["ready"] = False
+    _seat_player(g, p)
+    _enter_player_rooms(game_id, p)
     _emit_lobby(game_id)
 
 
 @socketio.on("set_role")
+@_game_action
 def on_set_role(data):
     game_id = (data.get("game_id") or "").upper()
     name    = data.get("name", "")
@@ -995,20 +1222,26 @@ def on_set_role(data):
     if not _player_in_game(game_id, name):
         return emit("error", {"msg": "Player not found"})
 
-    p = games[game_id]["players"][name]
+    g = games[game_id]
+    p = g["players"][name]
     team = p["team"]
 
     if role:
-        for other_name, other_p in games[game_id]["players"].items():
-            if other_name != name and other_p["team"] == team and other_p["role"] == role:
-                return emit("error", {"msg": f"{role} already taken on {team} team"})
+        holder = g["by_team_role"].get((team, role))
+        if holder is not None and holder is not p:
+            return emit("error", {"msg": f"{role} already taken on {team} team"})
 
+    _leave_player_rooms(game_id, p)
+    _unseat_player(g, p)
     p["role"] = role
     p["ready"] = False
+    _seat_player(g, p)
+    _enter_player_rooms(game_id, p)
     _emit_lobby(game_id)
 
 
 @socketio.on("player_ready")
+@_game_action
 def on_player_ready(data):
     game_id = (data.get("game_id") or "").upper()
     name    = data.get("name", "")
@@ -1023,6 +1256,7 @@ def on_player_ready(data):
 
 
 @socketio.on("add_bot")
+@_game_action
 def on_add_bot(data):
     """Host adds a bot to a specific team/role slot."""
     game_id = (data.get("game_id") or "").upper()
@@ -1043,28 +1277,31 @@ def on_add_bot(data):
         return emit("error", {"msg": "Invalid role"})
 
     # Check role not already taken on this team
-    for p in g["players"].values():
-        if p["team"] == team and p["role"] == role:
-            return emit("error", {"msg": f"{role} already taken on {team} team"})
+    if (team, role) in g["by_team_role"]:
+        return emit("error", {"msg": f"{role} already taken on {team} team"})
 
     # Check total player count
     if len(g["players"]) >= 8:
         return emit("error", {"msg": "Lobby is full (max 8 players)"})
 
-    bot_player = _make_bot_player(team, role)
+    bot_player, bot = _make_bot_player(team, role)
     # Ensure unique name
     base_name = bot_player["name"]
     counter = 2
-    while bot_player["name"] in g["players"]:
+    while bot_player["name"].lower() in g["name_index"]:
         bot_player["name"] = f"{base_name}_{counter}"
         counter += 1
 
     g["players"][bot_player["name"]] = bot_player
+    g["bots"][bot_player["name"]] = bot
+    g["name_index"][bot_player["name"].lower()] = ("player", bot_player["name"])
+    _seat_player(g, bot_player)
     _emit_lobby(game_id)
     emit("bot_added", {"team": team, "role": role, "name": bot_player["name"]})
 
 
 @socketio.on("remove_bot")
+@_game_action
 def on_remove_bot(data):
     """Host removes a bot player."""
     game_id  = (data.get("game_id") or "").upper()
@@ -1083,11 +1320,15 @@ def on_remove_bot(data):
     if not g["players"][bot_name].get("is_bot"):
         return emit("error", {"msg": "That player is not a bot"})
 
+    _unseat_player(g, g["players"][bot_name])
     del g["players"][bot_name]
+    del g["bots"][bot_name]
+    del g["name_index"][bot_name.lower()]
     _emit_lobby(game_id)
 
 
 @socketio.on("start_game")
+@_game_action
 def on_start_game(data):
     game_id = (data.get("game_id") or "").upper()
     name    = data.get("name", "")
@@ -1106,9 +1347,12 @@ def on_start_game(data):
     import random; random.shuffle(teams_present)
 
     g["game"] = gs.make_game("alpha")
+    g["sent_states"] = {}
+    g["sent_rev"] = None
     g["game"]["turn_order"] = teams_present
     g["game"]["active_team"] = teams_present[0]  # explicit active team for surface-bonus tracking
     g["game"]["phase"] = "placement"
+    gs.mark_changed(g["game"])
 
     socketio.emit("game_started", {
         "map": {
@@ -1128,6 +1372,7 @@ def on_start_game(data):
 # ── Socket Events — Placement ─────────────────────────────────────────────────
 
 @socketio.on("place_sub")
+@_game_action
 def on_place_sub(data):
     game_id = (data.get("game_id") or "").upper()
     name    = data.get("name", "")
@@ -1147,11 +1392,11 @@ def on_place_sub(data):
     if not ok:
         return emit("error", {"msg": msg})
 
-    socketio.emit("sub_placed", {"team": p["team"]}, room=game_id)
+    _emit(game_id, "sub_placed", {"team": p["team"]}, room=game_id)
 
     if g["game"]["phase"] == "playing":
         current = gs.current_team(g["game"])
-        socketio.emit("game_phase", {"current_team": current}, room=game_id)
+        _emit(game_id, "game_phase", {"current_team": current}, room=game_id)
         _broadcast_game_state(game_id)
 
     # Schedule bots to handle other team's placement or first move
@@ -1176,6 +1421,7 @@ def _get_captain(game_id, name):
 
 
 @socketio.on("captain_move")
+@_game_action
 def on_captain_move(data):
     game_id   = (data.get("game_id") or "").upper()
     name      = data.get("name", "")
@@ -1193,6 +1439,7 @@ def on_captain_move(data):
 
 
 @socketio.on("captain_surface")
+@_game_action
 def on_captain_surface(data):
     game_id = (data.get("game_id") or "").upper()
     name    = data.get("name", "")
@@ -1209,6 +1456,7 @@ def on_captain_surface(data):
 
 
 @socketio.on("captain_dive")
+@_game_action
 def on_captain_dive(data):
     game_id = (data.get("game_id") or "").upper()
     name    = data.get("name", "")
@@ -1221,10 +1469,11 @@ def on_captain_dive(data):
         return emit("error", {"msg": msg})
 
     emit("dive_ack", {})
-    socketio.emit("dive_announced", {"team": p["team"]}, room=game_id)
+    _emit(game_id, "dive_announced", {"team": p["team"]}, room=game_id)
 
 
 @socketio.on("captain_torpedo")
+@_game_action
 def on_captain_torpedo(data):
     game_id = (data.get("game_id") or "").upper()
     name    = data.get("name", "")
@@ -1240,13 +1489,14 @@ def on_captain_torpedo(data):
 
     _dispatch_events(game_id, game, events)
     _emit_to_team_role(game_id, p["team"], "captain", "systems_update",
-                       {"systems": game["submarines"][p["team"]]["systems"]})
+                       {"systems": dict(game["submarines"][p["team"]]["systems"])})
     _emit_to_team_role(game_id, p["team"], "first_mate", "systems_update",
-                       {"systems": game["submarines"][p["team"]]["systems"]})
+                       {"systems": dict(game["submarines"][p["team"]]["systems"])})
     _check_turn_auto_advance(game_id, game)
 
 
 @socketio.on("captain_mine_place")
+@_game_action
 def on_captain_mine_place(data):
     game_id = (data.get("game_id") or "").upper()
     name    = data.get("name", "")
@@ -1265,6 +1515,7 @@ def on_captain_mine_place(data):
 
 
 @socketio.on("captain_mine_det")
+@_game_action
 def on_captain_mine_det(data):
     game_id    = (data.get("game_id") or "").upper()
     name       = data.get("name", "")
@@ -1279,12 +1530,13 @@ def on_captain_mine_det(data):
 
     _dispatch_events(game_id, game, events)
     _emit_to_team_role(game_id, p["team"], "captain", "mine_placed_ack",
-                       {"mines": game["submarines"][p["team"]]["mines"],
-                        "systems": game["submarines"][p["team"]]["systems"]})
+                       {"mines": list(game["submarines"][p["team"]]["mines"]),
+                        "systems": dict(game["submarines"][p["team"]]["systems"])})
     _check_turn_auto_advance(game_id, game)
 
 
 @socketio.on("captain_sonar")
+@_game_action
 def on_captain_sonar(data):
     """Captain activates sonar (interactive: enemy captain must respond)."""
     game_id = (data.get("game_id") or "").upper()
@@ -1302,6 +1554,7 @@ def on_captain_sonar(data):
 
 
 @socketio.on("sonar_respond")
+@_game_action
 def on_sonar_respond(data):
     """Enemy captain responds to a sonar query with 2 pieces of info (1 true, 1 false)."""
     game_id = (data.get("game_id") or "").upper()
@@ -1346,6 +1599,7 @@ def on_sonar_respond(data):
 
 
 @socketio.on("captain_drone")
+@_game_action
 def on_captain_drone(data):
     game_id    = (data.get("game_id") or "").upper()
     name       = data.get("name", "")
@@ -1363,6 +1617,7 @@ def on_captain_drone(data):
 
 
 @socketio.on("captain_stealth")
+@_game_action
 def on_captain_stealth(data):
     game_id   = (data.get("game_id") or "").upper()
     name      = data.get("name", "")
@@ -1381,6 +1636,7 @@ def on_captain_stealth(data):
 
 
 @socketio.on("captain_end_turn")
+@_game_action
 def on_captain_end_turn(data):
     game_id = (data.get("game_id") or "").upper()
     name    = data.get("name", "")
@@ -1400,6 +1656,7 @@ def on_captain_end_turn(data):
 # ── Socket Events — Engineer ──────────────────────────────────────────────────
 
 @socketio.on("engineer_mark")
+@_game_action
 def on_engineer_mark(data):
     game_id   = (data.get("game_id") or "").upper()
     name      = data.get("name", "")
@@ -1418,7 +1675,7 @@ def on_engineer_mark(data):
     if not ok:
         return emit("error", {"msg": msg})
 
-    emit("board_update", {"board": g["game"]["submarines"][p["team"]]["engineering"]})
+    emit("board_update", {"board": gs.engineering_view(g["game"]["submarines"][p["team"]])})
     _dispatch_events(game_id, g["game"], events)
     _check_turn_auto_advance(game_id, g["game"])
 
@@ -1426,6 +1683,7 @@ def on_engineer_mark(data):
 # ── Socket Events — First Mate ────────────────────────────────────────────────
 
 @socketio.on("first_mate_charge")
+@_game_action
 def on_first_mate_charge(data):
     game_id = (data.get("game_id") or "").upper()
     name    = data.get("name", "")
@@ -1449,6 +1707,7 @@ def on_first_mate_charge(data):
 
 
 @socketio.on("first_mate_sonar")
+@_game_action
 def on_first_mate_sonar(data):
     """First mate activates sonar (interactive: enemy captain must respond)."""
     game_id = (data.get("game_id") or "").upper()
@@ -1473,6 +1732,7 @@ def on_first_mate_sonar(data):
 
 
 @socketio.on("first_mate_drone")
+@_game_action
 def on_first_mate_drone(data):
     """First mate activates drone (green system — operated by FM, not captain)."""
     game_id    = (data.get("game_id") or "").upper()
@@ -1503,10 +1763,7 @@ def on_ro_canvas_stroke(data):
     game_id = (data.get("game_id") or "").upper()
     if game_id not in games:
         return
-    # Relay to all connected spectators
-    for spec in _get_spectators(game_id).values():
-        if spec.get("sid"):
-            socketio.emit("ro_canvas_stroke", data, room=spec["sid"])
+    socketio.emit("ro_canvas_stroke", data, room=_spectator_room(game_id))
 
 
 # ── Auto-advance helper ───────────────────────────────────────────────────────
@@ -1524,8 +1781,8 @@ def _check_turn_auto_advance(game_id, game):
             # Force surface (blackout)
             ok, msg, events = gs.captain_surface(game, team)
             if ok:
-                socketio.emit("blackout_announced",
-                              {"team": team, "msg": "No valid moves — surfacing!"}, room=game_id)
+                _emit(game_id, "blackout_announced",
+                      {"team": team, "msg": "No valid moves — surfacing!"}, room=game_id)
                 _dispatch_events(game_id, game, events)
 
     _broadcast_game_state(game_id)
@@ -1535,5 +1792,19 @@ def _check_turn_auto_advance(game_id, game):
 # ── Entry point ───────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
+    import socket
+    import eventlet.wsgi
+
+    class _NoDelayProtocol(eventlet.wsgi.HttpProtocol):
+        """eventlet's connection handler with Nagle's algorithm off, so the many small
+        Socket.IO frames of a turn go out at once instead of waiting for ACKs."""
+
+        def setup(self):
+            super().setup()
+            try:
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except OSError:
+                pass
+
     print("Starting Captain Sonar server on http://localhost:5000")
-    socketio.run(app, host="0.0.0.0", port=5000, debug=True)
+    socketio.run(app, host="0.0.0.0", port=5000, debug=True, protocol=_NoDelayProtocol)
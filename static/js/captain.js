@@ -39,13 +39,14 @@ const ISLAND_SET = new Set(ISLANDS.map(([r,c]) => `${r},${c}`));
 
 // ── Socket ───────────────────────────────────────────────────
 const socket = io();
+handleBatches(socket);
 
 socket.on('connect', () => {
   socket.emit('join_room',  {game_id: GAME_ID});
   socket.emit('join_game',  {game_id: GAME_ID, name: MY_NAME});
 });
 
-socket.on('game_state', state => { updateFromState(state); });
+onGameState(socket, state => { updateFromState(state); });
 
 socket.on('game_started', () => { renderMap(); });
 
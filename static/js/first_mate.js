@@ -22,13 +22,14 @@ let isMyTurn   = false;
 let systemUsed = false;
 
 const socket = io();
+handleBatches(socket);
 
 socket.on('connect', () => {
   socket.emit('join_room', {game_id: GAME_ID});
   socket.emit('join_game', {game_id: GAME_ID, name: MY_NAME});
 });
 
-socket.on('game_state', state => {
+onGameState(socket, state => {
   if (!state || !state.submarines) return;
   const mySub = state.submarines[MY_TEAM];
   if (mySub) { myHealth = mySub.health; systems = mySub.systems || systems; }
@@ -140,6 +141,7 @@ socket.on('circuit_cleared', data => {
 socket.on('drone_result', data => {
   showToast(data.in_sector ? `Drone: Enemy IS in sector ${data.ask_sector}! 🎯` : `Drone: Enemy NOT in sector ${data.ask_sector}`);
   logEvent(`🛸 Drone → sector ${data.ask_sector}: ${data.in_sector ? 'YES' : 'NO'}`, 'highlight');
+  systems    = data.systems;
   systemUsed = true;
   renderSystems();
 });
@@ -30,13 +30,14 @@ let panOffsetX = 0, panOffsetY = 0;
 let strokeBuffer = null;  // {points: [{x,y}], tool}
 
 const socket = io();
+handleBatches(socket);
 
 socket.on('connect', () => {
   socket.emit('join_room', {game_id: GAME_ID});
   socket.emit('join_game', {game_id: GAME_ID, name: MY_NAME});
 });
 
-socket.on('game_state', state => {
+onGameState(socket, state => {
   if (!state || !state.submarines) return;
   const mySub    = state.submarines[MY_TEAM];
   const enemySub = state.submarines[ENEMY_TEAM];
@@ -22,6 +22,7 @@ let roCanvases = {};   // { blue: {canvas, ctx}, red: {canvas, ctx} }
 
 // ── Socket ────────────────────────────────────────────────────────────────────
 const socket = io();
+handleBatches(socket);
 
 socket.on('connect', () => {
   socket.emit('join_room',         { game_id: GAME_ID });
@@ -33,7 +34,7 @@ socket.on('spectator_ack', () => {
   document.getElementById('spec-status').textContent = 'Watching live game';
 });
 
-socket.on('game_state', state => {
+onGameState(socket, state => {
   if (!state || !state.submarines) return;
   lastBlue = state.submarines.blue;
   lastRed  = state.submarines.red;
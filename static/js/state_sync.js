@@ -0,0 +1,35 @@
+/* ============================================================
+   Captain Sonar — state_sync.js
+   Shared by every in-game view. The server sends a full
+   'game_state' on join, then 'game_state_patch' updates that
+   carry only the top-level keys (and submarines) that changed.
+   Consecutive events to one room may arrive as a single 'batch'.
+   ============================================================ */
+
+// Replay 'batch' frames ([[event, data], ...]) through the socket's own handlers.
+function handleBatches(socket) {
+  socket.on('batch', items => {
+    for (const [event, data] of items) {
+      for (const fn of socket.listeners(event)) fn(data);
+    }
+  });
+}
+
+// Call handler(state) with the full, patched state after every update.
+function onGameState(socket, handler) {
+  let state = null;
+
+  socket.on('game_state', full => {
+    state = full;
+    handler(state);
+  });
+
+  socket.on('game_state_patch', patch => {
+    if (!state) return;   // a full state always arrives first on join
+    const submarines = patch.submarines
+      ? {...state.submarines, ...patch.submarines}
+      : state.submarines;
+    state = {...state, ...patch, submarines};
+    handler(state);
+  });
+}
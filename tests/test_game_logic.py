@@ -54,7 +54,7 @@ def test_placement_valid():
     game = fresh_game()
     ok, err = gs.place_submarine(game, "blue", 5, 4)
     assert ok, err
-    assert game["submarines"]["blue"]["position"] == [5, 4]
+    assert game["submarines"]["blue"]["position"] == (5, 4)
 
 
 def test_placement_on_island_rejected():
@@ -71,6 +71,18 @@ def test_placement_out_of_bounds_rejected():
     assert not ok
 
 
+def test_is_valid_position_bounds_and_islands():
+    game = fresh_game()
+    rows, cols = game["map"]["rows"], game["map"]["cols"]
+    r, c = sorted(game["island_set"])[0]
+    assert not gs.is_valid_position(game, r, c)
+    for row, col in [(-1, 0), (0, -1), (rows, 0), (0, cols)]:
+        assert not gs.is_valid_position(game, row, col)
+    water = sum(gs.is_valid_position(game, row, col)
+                for row in range(rows) for col in range(cols))
+    assert water == rows * cols - len(game["island_set"])
+
+
 def test_placement_twice_rejected():
     game = fresh_game()
     gs.place_submarine(game, "blue", 5, 4)
@@ -108,7 +120,7 @@ def test_move_north_south_west_east():
         ok, msg, _ = gs.captain_move(game, "blue", direction)
         assert ok, f"{direction} failed: {msg}"
         pos = game["submarines"]["blue"]["position"]
-        assert pos == [8 + dr, 9 + dc]
+        assert pos == (8 + dr, 9 + dc)
 
 
 def test_move_blocked_by_island():
@@ -150,6 +162,14 @@ def test_cannot_move_twice():
     assert "Already moved" in msg
 
 
+def test_move_invalid_direction():
+    game = place_both(fresh_game())
+    ok, msg, _ = gs.captain_move(game, "blue", "up")
+    assert not ok
+    assert "direction" in msg.lower()
+    assert not game["turn_state"]["moved"]
+
+
 # ────────────────────────────────────────────────────────────────────────────
 # 3. Turn Gating — the critical fix
 # ────────────────────────────────────────────────────────────────────────────
@@ -192,6 +212,35 @@ def test_can_end_turn_after_all_roles():
     assert ok, msg
 
 
+def test_can_end_turn_without_fm_when_all_systems_full():
+    """The first mate has nothing to charge once every system is full."""
+    game = place_both(fresh_game())
+    sub = game["submarines"]["blue"]
+    for name, max_c in gs.SYSTEM_MAX_CHARGE.items():
+        gs.set_charge(sub, name, max_c)
+    gs.captain_move(game, "blue", "east")
+    gs.engineer_mark(game, "blue", "east", 0)
+    ok, _, _ = gs.first_mate_charge(game, "blue", "torpedo")
+    assert not ok
+    ok, msg, _ = gs.end_turn(game, "blue")
+    assert ok, msg
+
+
+def test_full_mask_follows_charges():
+    game = place_both(fresh_game())
+    sub = game["submarines"]["blue"]
+    for name, max_c in gs.SYSTEM_MAX_CHARGE.items():
+        gs.set_charge(sub, name, max_c - 1)
+    assert sub["full"] == 0
+    gs.captain_move(game, "blue", "east")
+    gs.first_mate_charge(game, "blue", "torpedo")
+    assert sub["full"] == gs.SYSTEM_BIT["torpedo"]
+    ok, msg, _ = gs.captain_fire_torpedo(game, "blue", 5, 8)
+    assert ok, msg
+    assert sub["systems"]["torpedo"] == 0
+    assert sub["full"] == 0
+
+
 def test_can_end_turn_after_surface_immediately():
     """Surface auto-sets engineer_done + first_mate_done, so end turn allowed."""
     game = place_both(fresh_game())
@@ -251,6 +300,14 @@ def test_surface_announces_sector():
     assert 1 <= surfaced_ev["sector"] <= 9
 
 
+def test_cannot_surface_after_moving():
+    game = place_both(fresh_game())
+    gs.captain_move(game, "blue", "east")
+    ok, msg, _ = gs.captain_surface(game, "blue")
+    assert not ok
+    assert msg == "Already acted this turn"
+
+
 def test_dive_clears_surfaced_flag():
     game = place_both(fresh_game())
     gs.captain_surface(game, "blue")
@@ -298,7 +355,7 @@ def test_engineer_marks_set_done_flag():
 def test_engineer_circuit_clear_no_damage():
     """Marking all C1 nodes should clear them without causing damage."""
     game = place_both(fresh_game())
-    board = game["submarines"]["blue"]["engineering"]
+    board = gs.make_engineering_board()
     # C1 nodes: west[0], north[0], south[0], east[0]  — one per direction, all at index 0
     # Mark first 3 manually then verify circuit clears on 4th
     board["west"][0]["marked"]  = True
@@ -320,7 +377,7 @@ def test_engineer_circuit_clear_no_damage():
 def test_direction_damage_on_full_column():
     """Filling all 6 nodes in a direction causes 1 damage and clears that direction."""
     game = place_both(fresh_game())
-    board = game["submarines"]["blue"]["engineering"]
+    board = gs.make_engineering_board()
     # Mark 5 east nodes
     for i in range(5):
         board["east"][i]["marked"] = True
@@ -333,6 +390,18 @@ def test_direction_damage_on_full_column():
     assert all(not board["east"][i]["marked"] for i in range(6))
 
 
+def test_engineer_mask_matches_board():
+    game = place_both(fresh_game())
+    sub = game["submarines"]["blue"]
+    gs.captain_move(game, "blue", "east")
+    gs.engineer_mark(game, "blue", "east", 1)
+    assert sub["eng_marked"] == gs.NODE_BIT["east"][1]
+    assert gs.board_bits(gs.engineering_view(sub)) == sub["eng_marked"]
+    assert sub["blocked"] == gs.SYSTEM_BIT["sonar"] | gs.SYSTEM_BIT["drone"]
+    assert gs.is_system_blocked(sub, "sonar")
+    assert not gs.is_system_blocked(sub, "torpedo")
+
+
 # ────────────────────────────────────────────────────────────────────────────
 # 6. First Mate
 # ────────────────────────────────────────────────────────────────────────────
@@ -427,6 +496,14 @@ def test_torpedo_out_of_range():
     assert "range" in msg.lower()
 
 
+def test_torpedo_cannot_target_own_cell():
+    game = place_both(fresh_game(), blue_pos=(5,5))
+    game["submarines"]["blue"]["systems"]["torpedo"] = 3
+    ok, msg, _ = gs.captain_fire_torpedo(game, "blue", 5, 5)
+    assert not ok
+    assert "range" in msg.lower()
+
+
 def test_torpedo_not_charged():
     game = place_both(fresh_game())
     ok, msg, _ = gs.captain_fire_torpedo(game, "blue", 5, 5)
@@ -434,6 +511,20 @@ def test_torpedo_not_charged():
     assert "charged" in msg.lower()
 
 
+def test_torpedo_blocked_by_red_node():
+    """A marked red node blocks the torpedo: firing costs 1 damage instead."""
+    game = place_both(fresh_game(), blue_pos=(5,4), red_pos=(5,6))
+    game["submarines"]["blue"]["systems"]["torpedo"] = 3
+    gs.captain_move(game, "blue", "east")
+    gs.engineer_mark(game, "blue", "east", 4)   # red, non-circuit
+    ok, msg, events = gs.captain_fire_torpedo(game, "blue", 5, 6)
+    assert ok
+    dmg = next(e for e in events if e["type"] == "damage")
+    assert dmg["team"] == "blue" and dmg["cause"] == "system_failure"
+    assert game["submarines"]["red"]["health"] == 4
+    assert game["submarines"]["blue"]["systems"]["torpedo"] == 3
+
+
 def test_game_over_when_health_zero():
     game = place_both(fresh_game(), blue_pos=(5,4), red_pos=(5,6))
     game["submarines"]["red"]["health"] = 2
@@ -446,6 +537,18 @@ def test_game_over_when_health_zero():
     assert game["phase"] == "ended"
 
 
+def test_explosion_sinking_both_subs_ends_game_once():
+    game = place_both(fresh_game(), blue_pos=(5,4), red_pos=(5,5))
+    game["submarines"]["blue"]["health"] = 1
+    game["submarines"]["red"]["health"] = 1
+    game["submarines"]["blue"]["systems"]["torpedo"] = 3
+    ok, _, events = gs.captain_fire_torpedo(game, "blue", 5, 5)
+    assert ok
+    assert len([e for e in events if e["type"] == "damage"]) == 2
+    assert len([e for e in events if e["type"] == "game_over"]) == 1
+    assert game["phase"] == "ended"
+
+
 # ────────────────────────────────────────────────────────────────────────────
 # 8. Mine
 # ────────────────────────────────────────────────────────────────────────────
@@ -455,7 +558,20 @@ def test_mine_place_adjacent():
     game["submarines"]["blue"]["systems"]["mine"] = 3
     ok, msg, _ = gs.captain_place_mine(game, "blue", 5, 5)
     assert ok, msg
-    assert [5, 5] in game["submarines"]["blue"]["mines"]
+    assert (5, 5) in game["submarines"]["blue"]["mines"]
+
+
+def test_cannot_move_into_own_mine():
+    game = place_both(fresh_game(), blue_pos=(5,4))
+    game["submarines"]["blue"]["systems"]["mine"] = 3
+    gs.captain_place_mine(game, "blue", 5, 5)
+    ok, msg, _ = gs.captain_move(game, "blue", "east")
+    assert not ok
+    assert "mine" in msg.lower()
+    # Once detonated the cell is free again
+    gs.captain_detonate_mine(game, "blue", 0)
+    ok, msg, _ = gs.captain_move(game, "blue", "east")
+    assert ok, msg
 
 
 def test_mine_place_non_adjacent_rejected():
@@ -486,7 +602,7 @@ def test_stealth_valid():
     ok, msg, events = gs.captain_use_stealth(game, "blue", "east", 2)
     assert ok, msg
     pos = game["submarines"]["blue"]["position"]
-    assert pos == [5, 6]
+    assert pos == (5, 6)
 
 
 def test_stealth_sets_eng_fm_done():
@@ -514,6 +630,16 @@ def test_stealth_max_4_moves():
     assert "4" in msg
 
 
+def test_stealth_blocked_by_island():
+    """Alpha has an island at (3,1): two steps north from (5,1) would cross it."""
+    game = place_both(fresh_game(), blue_pos=(5,1))
+    game["submarines"]["blue"]["systems"]["stealth"] = 5
+    ok, msg, _ = gs.captain_use_stealth(game, "blue", "north", 2)
+    assert not ok
+    assert "island" in msg.lower()
+    assert game["submarines"]["blue"]["position"] == (5, 1)
+
+
 def test_stealth_straight_line_only():
     """Stealth must be a single direction — mixed directions not possible with new API."""
     game = place_both(fresh_game(), blue_pos=(5,4))
@@ -532,7 +658,7 @@ def test_stealth_zero_steps():
     assert ok, msg
     # Position unchanged
     pos = game["submarines"]["blue"]["position"]
-    assert pos == [5, 4]
+    assert pos == (5, 4)
     # eng_done + first_mate_done set
     assert game["turn_state"]["engineer_done"] == True
     assert game["turn_state"]["first_mate_done"] == True
@@ -578,6 +704,78 @@ def test_drone_result_boolean():
     assert len(events) > 0
 
 
+# ────────────────────────────────────────────────────────────────────────────
+# 11. Serialization
+# ────────────────────────────────────────────────────────────────────────────
+
+def test_serialize_hides_enemy_submarine():
+    game = place_both(fresh_game(), blue_pos=(5,4), red_pos=(10,10))
+    view = gs.serialize_game(game, "blue")
+    own, enemy = view["submarines"]["blue"], view["submarines"]["red"]
+    assert own["position"] == (5, 4)
+    assert own["engineering"] == gs.engineering_view(game["submarines"]["blue"])
+    for key in ("position", "trail", "mines", "engineering", "sector"):
+        assert enemy[key] is None
+    # Sector is revealed once the enemy surfaces, and hidden again after diving
+    full_turn_blue(game)
+    ok, msg, _ = gs.captain_surface(game, "red")
+    assert ok, msg
+    enemy = gs.serialize_game(game, "blue")["submarines"]["red"]
+    assert enemy["sector"] == 9
+    assert enemy["position"] is None
+    gs.captain_dive(game, "red")
+    assert gs.serialize_game(game, "blue")["submarines"]["red"]["sector"] is None
+
+
+def test_serialize_cached_until_state_changes():
+    game = place_both(fresh_game(), blue_pos=(5,4), red_pos=(10,10))
+    view = gs.serialize_game(game, "blue")
+    assert gs.serialize_game(game, "blue") is view
+    assert gs.serialize_game(game, "red") is not view
+    ok, _, _ = gs.captain_move(game, "blue", "east")
+    assert ok
+    moved = gs.serialize_game(game, "blue")
+    assert moved is not view
+    assert moved["submarines"]["blue"]["position"] == (5, 5)
+    assert moved["turn_state"]["moved"]
+
+
+def test_rejected_action_keeps_cached_view():
+    game = place_both(fresh_game(), blue_pos=(5,4), red_pos=(10,10))
+    view = gs.serialize_game(game, "blue")
+    rev = game["rev"]
+    ok, _, _ = gs.captain_move(game, "red", "east")    # not red's turn
+    assert not ok
+    ok, _, _ = gs.first_mate_charge(game, "blue", "torpedo")   # captain hasn't moved
+    assert not ok
+    assert game["rev"] == rev
+    assert gs.serialize_game(game, "blue") is view
+
+
+def test_diff_view_contains_only_changes():
+    game = place_both(fresh_game(), blue_pos=(5,4), red_pos=(10,10))
+    before = gs.serialize_game(game, "blue")
+    assert gs.diff_view(before, gs.serialize_game(game, "blue")) == {}
+    gs.captain_move(game, "blue", "east")
+    gs.engineer_mark(game, "blue", "east", 0)
+    # The earlier view is a snapshot: in-place board changes don't leak into it
+    assert not before["submarines"]["blue"]["engineering"]["east"][0]["marked"]
+    patch = gs.diff_view(before, gs.serialize_game(game, "blue"))
+    assert set(patch) == {"turn_state", "submarines"}
+    assert set(patch["submarines"]) == {"blue"}
+    assert patch["submarines"]["blue"]["position"] == (5, 5)
+    assert patch["submarines"]["blue"]["engineering"]["east"][0]["marked"]
+
+
+def test_sector_table_matches_get_sector():
+    from maps import MAPS, get_sector
+    for map_def in MAPS.values():
+        size, cols = map_def["sector_size"], map_def["cols"]
+        for r in range(map_def["rows"]):
+            for c in range(cols):
+                assert map_def["sector_table"][r][c] == get_sector(r, c, size, cols)
+
+
 # ────────────────────────────────────────────────────────────────────────────
 # Run
 # ────────────────────────────────────────────────────────────────────────────
@@ -588,21 +786,25 @@ if __name__ == "__main__":
         # Placement
         test_placement_valid, test_placement_on_island_rejected,
         test_placement_out_of_bounds_rejected, test_placement_twice_rejected,
+        test_is_valid_position_bounds_and_islands,
         test_both_placed_starts_game,
         # Movement
         test_move_valid, test_move_north_south_west_east,
         test_move_blocked_by_island, test_move_cannot_revisit_trail,
-        test_move_not_your_turn, test_cannot_move_twice,
+        test_move_not_your_turn, test_cannot_move_twice, test_move_invalid_direction,
         # Turn gating
         test_cannot_end_turn_without_moving,
         test_cannot_end_turn_without_engineer_mark,
         test_cannot_end_turn_without_fm_charge,
         test_can_end_turn_after_all_roles,
+        test_can_end_turn_without_fm_when_all_systems_full,
+        test_full_mask_follows_charges,
         test_can_end_turn_after_surface_immediately,
         test_turn_switches_to_red, test_turn_state_reset_after_end_turn,
         # Surface
         test_surface_costs_1_hp, test_surface_clears_trail,
-        test_surface_announces_sector, test_dive_clears_surfaced_flag,
+        test_surface_announces_sector, test_cannot_surface_after_moving,
+        test_dive_clears_surfaced_flag,
         # Engineer
         test_engineer_must_mark_correct_direction,
         test_engineer_cannot_mark_twice,
@@ -610,24 +812,34 @@ if __name__ == "__main__":
         test_engineer_marks_set_done_flag,
         test_engineer_circuit_clear_no_damage,
         test_direction_damage_on_full_column,
+        test_engineer_mask_matches_board,
         # First mate
         test_fm_charge_increments_system, test_fm_cannot_charge_without_move,
         test_fm_cannot_charge_twice, test_fm_cannot_overcharge,
         test_fm_system_ready_at_max,
         # Torpedo
         test_torpedo_direct_hit_2_damage, test_torpedo_adjacent_1_damage,
-        test_torpedo_out_of_range, test_torpedo_not_charged,
+        test_torpedo_out_of_range, test_torpedo_cannot_target_own_cell, test_torpedo_not_charged,
+        test_torpedo_blocked_by_red_node,
         test_game_over_when_health_zero,
+        test_explosion_sinking_both_subs_ends_game_once,
         # Mine
         test_mine_place_adjacent, test_mine_place_non_adjacent_rejected,
+        test_cannot_move_into_own_mine,
         test_mine_detonate_deals_damage,
         # Stealth
         test_stealth_valid, test_stealth_sets_eng_fm_done,
-        test_stealth_no_direction_set, test_stealth_max_4_moves,
+        test_stealth_no_direction_set, test_stealth_max_4_moves, test_stealth_blocked_by_island,
         test_stealth_straight_line_only, test_stealth_zero_steps,
         test_stealth_cannot_revisit,
         # Sonar/Drone
         test_sonar_result_has_correct_format, test_drone_result_boolean,
+        # Serialization
+        test_serialize_hides_enemy_submarine,
+        test_serialize_cached_until_state_changes,
+        test_rejected_action_keeps_cached_view,
+        test_diff_view_contains_only_changes,
+        test_sector_table_matches_get_sector,
     ]
 
     passed = 0
@@ -0,0 +1,150 @@
+"""
+Tests for the Socket.IO layer in server.py, driven through Flask-SocketIO's
+test client (no network).
+
+Run:  python -m pytest tests/test_server.py -v
+  or: python tests/test_server.py
+"""
+import sys
+import os
+# Fix Windows console encoding (emojis in output)
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+pytest.importorskip("flask_socketio")
+
+import game_state as gs
+import server
+
+# ────────────────────────────────────────────────────────────────────────────
+# Helpers
+# ────────────────────────────────────────────────────────────────────────────
+
+def new_client():
+    return server.socketio.test_client(server.app)
+
+
+def create_game(client, name="Host"):
+    """Create a game as `name` and return its id."""
+    client.emit("create_game", {"name": name})
+    for msg in client.get_received():
+        if msg["name"] == "game_created":
+            return msg["args"][0]["game_id"]
+    raise AssertionError("no game_created")
+
+
+def received(client, event):
+    """Payloads of `event` received by client, unpacking "batch" frames."""
+    out = []
+    for msg in client.get_received():
+        if msg["name"] == "batch":
+            out.extend(data for ev, data in msg["args"][0] if ev == event)
+        elif msg["name"] == event:
+            out.append(msg["args"][0])
+    return out
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Lobby
+# ────────────────────────────────────────────────────────────────────────────
+
+def test_set_team_rejects_taken_seat():
+    host = new_client()
+    gid = create_game(host)
+    host.emit("set_role", {"game_id": gid, "name": "Host", "role": "captain"})
+    host.emit("add_bot", {"game_id": gid, "name": "Host", "team": "red", "role": "captain"})
+    host.get_received()
+
+    host.emit("set_team", {"game_id": gid, "name": "Host", "team": "red"})
+    errors = received(host, "error")
+    assert errors and "captain already taken" in errors[0]["msg"]
+    p = server.games[gid]["players"]["Host"]
+    assert (p["team"], p["role"]) == ("blue", "captain")
+    assert server.games[gid]["by_team_role"][("blue", "captain")] is p
+
+
+def start_bot_game(host):
+    """Game with Host as blue radio operator and bots in every other seat, started
+    with its bot loop held back (bot_tasks set) so the test can drive it."""
+    gid = create_game(host)
+    host.emit("set_role", {"game_id": gid, "name": "Host", "role": "radio_operator"})
+    for team, role in [("blue", "captain"), ("blue", "first_mate"), ("blue", "engineer"),
+                       ("red", "captain"), ("red", "first_mate"), ("red", "engineer")]:
+        host.emit("add_bot", {"game_id": gid, "name": "Host", "team": team, "role": role})
+    server.bot_tasks[gid] = True
+    host.emit("start_game", {"game_id": gid, "name": "Host"})
+    host.get_received()
+    return gid
+
+
+def test_bot_loop_exits_when_game_removed():
+    host = new_client()
+    gid = start_bot_game(host)
+    assert server._next_bot_step(gid) is not None
+
+    sleep = server.socketio.sleep
+    server.socketio.sleep = lambda seconds: server.games.pop(gid)
+    try:
+        server._run_bot_loop(gid)
+    finally:
+        server.socketio.sleep = sleep
+    assert gid not in server.games
+    assert server.bot_tasks[gid] is False
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Batched emits
+# ────────────────────────────────────────────────────────────────────────────
+
+def test_batched_payload_is_snapshot():
+    host = new_client()
+    gid = create_game(host)
+    host.emit("set_role", {"game_id": gid, "name": "Host", "role": "first_mate"})
+    host.get_received()
+    game = server.games[gid]["game"] = gs.make_game("alpha")
+    sub = game["submarines"]["blue"]
+
+    with server._batched(gid):
+        server._handle_system_charged(gid, game, {"team": "blue"})
+        gs.set_charge(sub, "torpedo", 2)   # changes after the emit is queued
+
+    updates = received(host, "systems_update")
+    assert updates and updates[0]["systems"]["torpedo"] == 0
+
+
+if __name__ == "__main__":
+    import traceback
+    tests = [
+        # Lobby
+        test_set_team_rejects_taken_seat,
+        test_bot_loop_exits_when_game_removed,
+        # Batched emits
+        test_batched_payload_is_snapshot,
+    ]
+
+    passed = 0
+    failed = 0
+    errors = []
+    for fn in tests:
+        try:
+            fn()
+            print(f"  ✅ {fn.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"  ❌ {fn.__name__}: {e}")
+            errors.append((fn.__name__, traceback.format_exc()))
+            failed += 1
+
+    print(f"\n{'='*55}")
+    print(f"Results: {passed} passed, {failed} failed out of {len(tests)} tests")
+    if errors:
+        print("\nFailure details:")
+        for name, tb in errors:
+            print(f"\n--- {name} ---")
+            print(tb)
+    else:
+        print("ALL TESTS PASSED!")
+    sys.exit(0 if failed == 0 else 1)